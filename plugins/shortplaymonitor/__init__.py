@@ -1,25 +1,17 @@
 import os
-import threading
 import datetime
 from pathlib import Path
 
-from typing import Any, List, Dict, Tuple, Optional
-from xml.dom import minidom
-from threading import Lock
+from typing import Any, List, Dict, Tuple, Optional, Set
 from app.chain.tmdb import TmdbChain
+from app.core.meta import MetaBase
 from app.core.metainfo import MetaInfoPath
 from app.schemas import MediaInfo, TransferInfo
-from app.utils.dom import DomUtils
-from PIL import Image
 import pytz
-from app.db.site_oper import SiteOper
 from apscheduler.schedulers.background import BackgroundScheduler
-from watchdog.events import FileSystemEventHandler
-from watchdog.observers import Observer
-from watchdog.observers.polling import PollingObserver
+from watchdog.events import FileCreatedEvent, FileSystemEventHandler
 from app.utils.common import retry
 from requests import RequestException
-from app.core.meta.words import WordsMatcher
 from app.log import logger
 from app.plugins import _PluginBase
 from app.core.config import settings
@@ -27,16 +19,26 @@ from app.utils.system import SystemUtils
 from app.schemas.types import NotificationType
 import re
 
-import chardet
-from lxml import etree
-
-from app.modules.indexer import TorrentSpider
-from app.helper.sites import SitesHelper
-
-from app.utils.http import RequestUtils
-
-ffmpeg_lock = threading.Lock()
-lock = Lock()
+from .cache import MediaCache
+from .event_queue import EventQueue
+from .locks import StripedLock
+from .thumbnail import ThumbnailEngine, parse_timelines
+from .processed_index import ProcessedIndex
+from .scanner import scan_roots, walk_files
+from .path_filter import PathFilter
+from .poster import PosterCropper, crop_poster, save_poster
+from .site_cover import SiteCoverFinder, parse_cover_sites
+from .downloader import ImageDownloader
+from .aggregator import DeadlineAggregator
+from .nfo import NfoWriter
+from .metrics import Metrics
+from .pipeline import FileJob, StagedPipeline
+from .resolver import TargetResolver
+from .watcher import INOTIFY_HINT, SharedObservers
+from .polling import SnapshotStore
+
+# 转移锁，按目标目录分段，同一目录下的转移串行执行，不同目录并行
+transfer_lock = StripedLock()
 
 
 class FileMonitorHandler(FileSystemEventHandler):
@@ -50,10 +52,10 @@ class FileMonitorHandler(FileSystemEventHandler):
         self.file_change = file_change
 
     def on_created(self, event):
-        self.file_change.event_handler(event=event, source_dir=self._watch_path, event_path=event.src_path)
+        self.file_change.enqueue_event(event=event, source_dir=self._watch_path, event_path=event.src_path)
 
     def on_moved(self, event):
-        self.file_change.event_handler(event=event, source_dir=self._watch_path, event_path=event.dest_path)
+        self.file_change.enqueue_event(event=event, source_dir=self._watch_path, event_path=event.dest_path)
 
 
 class ShortPlayMonitor(_PluginBase):
@@ -64,7 +66,7 @@ class ShortPlayMonitor(_PluginBase):
     # 插件图标
     plugin_icon = "Amule_B.png"
     # 插件版本
-    plugin_version = "3.2"
+    plugin_version = "3.3"
     # 插件作者
     plugin_author = "thsrite"
     # 作者主页
@@ -83,15 +85,51 @@ class ShortPlayMonitor(_PluginBase):
     _image = False
     _exclude_keywords = ""
     _transfer_type = "link"
-    _observer = []
-    _timeline = "00:00:10"
+    _observers: Optional[SharedObservers] = None
+    _watch_depth = 0
+    _poll_max_interval = 300
+    # 按深度监控时，超出深度的新目录的补扫延时（秒）
+    _deep_rescan_delays = (5, 60, 300)
+    # 截图时间点，多个时间点时一次截取后选画面内容最丰富的一帧
+    _timeline = "00:00:05,00:00:10,00:00:20,00:00:40"
+    _timelines = []
     _dirconf = {}
     _renameconf = {}
     _coverconf = {}
     tmdbchain = None
     _interval = 10
     _notify = False
-    _medias = {}
+    _notifier: Optional[DeadlineAggregator] = None
+    _batch = False
+    _batcher: Optional[DeadlineAggregator] = None
+    # 整季批量入库时，剧集在此期间（秒）没有新文件则开始处理
+    _batch_quiet_period = 10
+    # 整季批量入库时，剧集从第一个文件起最长等待时间（秒）
+    _batch_max_wait = 300
+    _cache_persist = False
+    _media_cache: Optional[MediaCache] = None
+    _event_queue: Optional[EventQueue] = None
+    _workers = 4
+    # 图片和NFO生成线程数
+    _artwork_workers = 2
+    # 识别 -> 转移 -> 图片和NFO 分阶段处理
+    _pipeline: Optional[StagedPipeline] = None
+    # 正在停止服务，停止期间不再执行新任务
+    _stopping = False
+    # 本次运行中已提交到刮削阶段、尚未完成的文件
+    _artwork_queued: Set[str] = set()
+    _thumb_concurrency = 2
+    _thumb_timeout = 60
+    _thumb_engine: Optional[ThumbnailEngine] = None
+    _catchup = False
+    _processed_index: Optional[ProcessedIndex] = None
+    _path_filter: Optional[PathFilter] = None
+    _cover_sites = ""
+    _cover_finder: Optional[SiteCoverFinder] = None
+    _image_downloader: Optional[ImageDownloader] = None
+    _nfo_writer: Optional[NfoWriter] = None
+    _resolver: Optional[TargetResolver] = None
+    _metrics: Optional[Metrics] = None
 
     # 定时器
     _scheduler: Optional[BackgroundScheduler] = None
@@ -101,27 +139,102 @@ class ShortPlayMonitor(_PluginBase):
         self._dirconf = {}
         self._renameconf = {}
         self._coverconf = {}
+        self._artwork_queued = set()
         self.tmdbchain = TmdbChain()
 
         if config:
             self._enabled = config.get("enabled")
             self._onlyonce = config.get("onlyonce")
             self._image = config.get("image")
-            self._interval = config.get("interval")
+            self._interval = self.__to_int(config.get("interval"), 10, "入库消息延迟")
             self._notify = config.get("notify")
             self._monitor_confs = config.get("monitor_confs")
             self._exclude_keywords = config.get("exclude_keywords") or ""
             self._transfer_type = config.get("transfer_type") or "link"
+            self._cache_persist = config.get("cache_persist")
+            self._workers = self.__to_int(config.get("workers"), 4, "处理线程数")
+            self._artwork_workers = self.__to_int(config.get("artwork_workers"), 2, "刮削线程数")
+            self._thumb_concurrency = self.__to_int(config.get("thumb_concurrency"), 2, "截图并发数")
+            self._thumb_timeout = self.__to_int(config.get("thumb_timeout"), 60, "截图超时")
+            self._timeline = config.get("timeline") or self._timeline
+            self._catchup = config.get("catchup")
+            self._batch = config.get("batch")
+            self._watch_depth = self.__to_int(config.get("watch_depth"), 0, "监控深度", minimum=0)
+            self._poll_max_interval = self.__to_int(config.get("poll_max_interval"), 300, "兼容模式最长轮询间隔")
+            self._cover_sites = config.get("cover_sites") or ""
 
         # 停止现有任务
         self.stop_service()
+        self._stopping = False
+
+        # 缩略图截取
+        self._thumb_engine = ThumbnailEngine(concurrency=self._thumb_concurrency,
+                                             timeout=self._thumb_timeout)
+        self._timelines = parse_timelines(self._timeline)
+
+        # 运行统计，重新加载配置时保留
+        if not self._metrics:
+            self._metrics = Metrics()
+            self._metrics.gauge("event_queue", lambda: self._event_queue.depth if self._event_queue else 0)
+            for stage in ("recognize", "transfer", "artwork"):
+                self._metrics.gauge(f"{stage}_queue",
+                                    lambda stage=stage: self._pipeline.depth(stage) if self._pipeline else 0)
+
+        # 图片下载
+        self._image_downloader = ImageDownloader()
+
+        # NFO生成
+        self._nfo_writer = NfoWriter(media_exts=settings.RMT_MEDIAEXT)
+
+        # 目标路径计算，按剧集目录缓存
+        self._resolver = TargetResolver(dirconf=self._dirconf, renameconf=self._renameconf)
+
+        # 路径过滤规则
+        self._path_filter = PathFilter(exclude_keywords=self._exclude_keywords,
+                                       extensions=settings.RMT_MEDIAEXT)
+
+        # 已处理文件索引
+        self._processed_index = ProcessedIndex(db_file=self.get_data_path() / "processed.db")
+
+        # 识别结果缓存
+        self._media_cache = MediaCache(
+            cache_file=self.get_data_path() / "media_cache.pkl" if self._cache_persist else None)
 
         if self._enabled or self._onlyonce:
+            # 分阶段处理，每个阶段同一剧集的文件按顺序处理；图片和NFO生成较慢，队列较长，不阻塞转移
+            self._pipeline = StagedPipeline(stages=[("recognize", self._workers, 100),
+                                                    ("transfer", self._workers, 100),
+                                                    ("artwork", self._artwork_workers, 1000)])
+
+            # 站点封面检索，站点在此解析一次，检索结果按标题缓存
+            self._cover_finder = SiteCoverFinder(
+                cache=MediaCache(ttl=7 * 86400,
+                                 negative_ttl=6 * 3600,
+                                 cache_file=self.get_data_path() / "cover_cache.pkl" if self._cache_persist else None),
+                site_confs=parse_cover_sites(self._cover_sites),
+                metrics=self._metrics)
+
             # 定时服务
             self._scheduler = BackgroundScheduler(timezone=settings.TZ)
             if self._notify:
-                # 追加入库消息统一发送服务
-                self._scheduler.add_job(self.send_msg, trigger='interval', seconds=15)
+                # 入库消息汇总，剧集静默期结束后统一发送
+                self._notifier = DeadlineAggregator(callback=self.send_msg,
+                                                    quiet_period=self._interval,
+                                                    name="ShortPlayMonitor-Notify")
+            if self._batch:
+                # 整季批量入库，同一剧集短时间内的文件合并为一个任务
+                self._batcher = DeadlineAggregator(callback=self.__submit_batch,
+                                                   quiet_period=self._batch_quiet_period,
+                                                   max_wait=self._batch_max_wait,
+                                                   name="ShortPlayMonitor-Batch")
+            # 重新提交上次停止时未处理的文件和未完成的图片和NFO生成
+            self._scheduler.add_job(func=self.__resume_pending, trigger='date',
+                                    run_date=datetime.datetime.now(
+                                        tz=pytz.timezone(settings.TZ)) + datetime.timedelta(seconds=3),
+                                    name="短剧监控恢复未完成任务")
+            if self._cache_persist:
+                # 定期持久化识别缓存
+                self._scheduler.add_job(self.__save_caches, trigger='interval', minutes=10)
 
             # 读取目录配置
             monitor_confs = self._monitor_confs.split("\n")
@@ -147,6 +260,10 @@ class ShortPlayMonitor(_PluginBase):
 
                 # 启用目录监控
                 if self._enabled:
+                    if not self._event_queue:
+                        # 文件事件合并队列
+                        self._event_queue = EventQueue(handler=self.event_handler)
+                        self._event_queue.start()
                     # 检查媒体库目录是不是下载目录的子目录
                     try:
                         if target_dir and Path(target_dir).is_relative_to(Path(source_dir)):
@@ -157,32 +274,39 @@ class ShortPlayMonitor(_PluginBase):
                         logger.debug(str(e))
                         pass
 
+                    if not self._observers:
+                        # 每种监控方式共用一个观察者
+                        self._observers = SharedObservers(
+                            watch_depth=self._watch_depth,
+                            on_new_dir=self.__on_new_dir,
+                            snapshot_store=SnapshotStore(snapshot_file=self.get_data_path() / "poll_snapshot.pkl"),
+                            exclude=self.__exclude_reason,
+                            poll_max_interval=self._poll_max_interval)
                     try:
-                        if mode == "compatibility":
-                            # 兼容模式，目录同步性能降低且NAS不能休眠，但可以兼容挂载的远程共享目录如SMB
-                            observer = PollingObserver(timeout=10)
+                        watches = self._observers.schedule(mode=mode, path=source_dir,
+                                                           handler=FileMonitorHandler(source_dir, self))
+                        if watches is None:
+                            logger.info(f"{source_dir} 的目录监控服务启动")
                         else:
-                            # 内部处理系统操作类型选择最优解
-                            observer = Observer(timeout=10)
-                        self._observer.append(observer)
-                        observer.schedule(FileMonitorHandler(source_dir, self), path=source_dir, recursive=True)
-                        observer.daemon = True
-                        observer.start()
-                        logger.info(f"{source_dir} 的目录监控服务启动")
+                            logger.info(f"{source_dir} 的目录监控服务启动，使用inotify {watches} 个")
                     except Exception as e:
                         err_msg = str(e)
                         if "inotify" in err_msg and "reached" in err_msg:
                             logger.warn(
-                                f"目录监控服务启动出现异常：{err_msg}，请在宿主机上（不是docker容器内）执行以下命令并重启："
-                                + """
-                                     echo fs.inotify.max_user_watches=524288 | sudo tee -a /etc/sysctl.conf
-                                     echo fs.inotify.max_user_instances=524288 | sudo tee -a /etc/sysctl.conf
-                                     sudo sysctl -p
-                                     """)
+                                f"目录监控服务启动出现异常：{err_msg}，请设置监控深度或在宿主机上（不是docker容器内）执行以下命令并重启："
+                                + INOTIFY_HINT)
                         else:
                             logger.error(f"{source_dir} 启动目录监控失败：{err_msg}")
                         self.systemmessage.put(f"{source_dir} 启动目录监控失败：{err_msg}")
 
+            if self._observers:
+                if self._observers.budgeted:
+                    logger.info(f"目录监控共使用inotify {self._observers.watches} 个，"
+                                f"系统上限 {self._observers.limit or '未知'}")
+                    # 按深度监控时，定时补扫监控深度以外的目录
+                    self._scheduler.add_job(self.__rescan_roots, trigger='interval', minutes=30,
+                                            name="短剧监控深层目录补扫")
+
             # 运行一次定时服务
             if self._onlyonce:
                 logger.info("短剧监控服务启动，立即运行一次")
@@ -194,6 +318,13 @@ class ShortPlayMonitor(_PluginBase):
                 self._onlyonce = False
                 # 保存配置
                 self.__update_config()
+            elif self._enabled and self._catchup:
+                # 补处理插件停止期间新增的文件，已处理的文件通过索引跳过
+                logger.info("短剧监控服务启动，补处理停止期间新增的文件")
+                self._scheduler.add_job(func=self.sync_all, trigger='date',
+                                        run_date=datetime.datetime.now(
+                                            tz=pytz.timezone(settings.TZ)) + datetime.timedelta(seconds=3),
+                                        name="短剧监控补处理")
 
             # 启动任务
             if self._scheduler.get_jobs():
@@ -207,17 +338,34 @@ class ShortPlayMonitor(_PluginBase):
 
     def sync_all(self):
         """
-        立即运行一次，全量同步目录中所有文件
+        立即运行一次，全量同步目录中所有文件，已处理过的文件跳过
         """
         logger.info("开始全量同步短剧监控目录 ...")
-        # 遍历所有监控目录
-        for mon_path in self._dirconf.keys():
-            # 遍历目录下所有文件
-            for file_path in SystemUtils.list_files(Path(mon_path), settings.RMT_MEDIAEXT):
-                self.__handle_file(is_directory=Path(file_path).is_dir(),
-                                   event_path=str(file_path),
-                                   source_dir=mon_path)
-        logger.info("全量同步短剧监控目录完成！")
+        # 已转移但图片和NFO未生成的文件在扫描时会被跳过，单独重新提交
+        self.__requeue_artwork()
+        skipped = 0
+        # 并发遍历所有监控目录，边扫描边处理，排除的目录整个跳过
+        for mon_path, entry in scan_roots(roots=list(self._dirconf.keys()),
+                                          extensions=settings.RMT_MEDIAEXT,
+                                          exclude=self.__exclude_reason):
+            try:
+                stat = entry.stat()
+            except OSError:
+                # 扫描后文件已被移动或删除
+                continue
+            # 已处理的文件不再识别
+            if self._processed_index.is_processed(entry.path, stat):
+                skipped += 1
+                continue
+            self.__submit_file(is_directory=False,
+                               event_path=entry.path,
+                               source_dir=mon_path)
+        # 剩余批次立即提交，等待处理完成
+        if self._batcher:
+            self._batcher.flush()
+        if self._pipeline:
+            self._pipeline.join()
+        logger.info(f"全量同步短剧监控目录完成！跳过已处理文件 {skipped} 个")
 
     def __handle_image(self):
         """
@@ -228,25 +376,29 @@ class ShortPlayMonitor(_PluginBase):
             return
 
         logger.info("开始全量裁剪封面 ...")
+        cropper = PosterCropper(processed_index=self._processed_index)
+        cropped, skipped = 0, 0
         # 遍历所有监控目录
         for mon_path in self._dirconf.keys():
             cover_conf = self._coverconf.get(mon_path)
             target_path = self._dirconf.get(mon_path)
-            # 遍历目录下所有文件
-            for file_path in SystemUtils.list_files(Path(target_path), ["poster.jpg"]):
-                try:
-                    if Path(file_path).name != "poster.jpg":
-                        continue
-                    image = Image.open(file_path)
-                    if image.width / image.height != int(str(cover_conf).split(":")[0]) / int(
-                            str(cover_conf).split(":")[1]):
-                        self.__save_poster(input_path=file_path,
-                                           poster_path=file_path,
-                                           cover_conf=cover_conf)
-                        logger.info(f"封面 {file_path} 已裁剪 比例为 {cover_conf}")
-                except Exception:
-                    continue
-        logger.info("全量裁剪封面完成！")
+            # 遍历目录下所有封面
+            posters = (entry.path for entry in walk_files(root=target_path, extensions=[".jpg"])
+                       if entry.name == "poster.jpg")
+            dir_cropped, dir_skipped = cropper.crop_all(poster_paths=posters, cover_conf=cover_conf)
+            cropped += dir_cropped
+            skipped += dir_skipped
+        logger.info(f"全量裁剪封面完成！裁剪 {cropped} 个，跳过 {skipped} 个")
+
+    def enqueue_event(self, event, source_dir: str, event_path: str):
+        """
+        文件事件入队，由队列合并重复事件并在文件写入完成后交给 event_handler 处理
+        :param event: 事件
+        :param source_dir: 监控目录
+        :param event_path: 事件文件路径
+        """
+        if self._event_queue:
+            self._event_queue.put(event=event, source_dir=source_dir, event_path=event_path)
 
     def event_handler(self, event, source_dir: str, event_path: str):
         """
@@ -255,239 +407,774 @@ class ShortPlayMonitor(_PluginBase):
         :param source_dir: 监控目录
         :param event_path: 事件文件路径
         """
-        # 回收站及隐藏的文件不处理
-        if (event_path.find("/@Recycle") != -1
-                or event_path.find("/#recycle") != -1
-                or event_path.find("/.") != -1
-                or event_path.find("/@eaDir") != -1):
-            logger.info(f"{event_path} 是回收站或隐藏的文件，跳过处理")
+        # 回收站、隐藏文件及命中过滤关键字的不处理
+        reason = self.__exclude_reason(event_path)
+        if reason:
+            logger.info(f"{event_path} {reason}，跳过处理")
             return
 
-        # 命中过滤关键字不处理
-        if self._exclude_keywords:
-            for keyword in self._exclude_keywords.split("\n"):
-                if keyword and re.findall(keyword, event_path):
-                    logger.info(f"{event_path} 命中过滤关键字 {keyword}，不处理")
-                    return
-
         # 不是媒体文件不处理
-        if Path(event_path).suffix not in settings.RMT_MEDIAEXT:
+        if not self._path_filter.is_media(event_path):
             logger.debug(f"{event_path} 不是媒体文件")
             return
 
+        # 已处理的文件不再处理，如兼容模式轮询快照未及时保存时重启后再次产生的事件
+        if not event.is_directory and self._processed_index and self._processed_index.is_processed(event_path):
+            logger.debug(f"{event_path} 已处理，跳过")
+            return
+
         # 文件发生变化
         logger.debug(f"变动类型 {event.event_type} 变动路径 {event_path}")
-        self.__handle_file(is_directory=event.is_directory,
+        self.__submit_file(is_directory=event.is_directory,
                            event_path=event_path,
                            source_dir=source_dir)
 
-    def __handle_file(self, is_directory: bool, event_path: str, source_dir: str):
+    def __on_new_dir(self, source_dir: str, dir_path: str, deep: bool):
         """
-        同步一个文件
-        :event.is_directory
+        按深度监控时新建目录的处理
+        监控添加前目录中可能已有文件，延时补扫一次；超出监控深度的目录之后的变化收不到事件，再按递增间隔补扫几次
+        :param source_dir: 监控目录
+        :param dir_path: 新建目录
+        :param deep: 是否超出监控深度
+        """
+        if not self._scheduler or self.__exclude_reason(dir_path + os.sep):
+            return
+        delays = self._deep_rescan_delays if deep else self._deep_rescan_delays[:1]
+        now = datetime.datetime.now(tz=pytz.timezone(settings.TZ))
+        for index, delay in enumerate(delays):
+            try:
+                self._scheduler.add_job(func=self.__rescan_dir, trigger='date',
+                                        run_date=now + datetime.timedelta(seconds=delay),
+                                        kwargs={"source_dir": source_dir, "dir_path": dir_path},
+                                        id=f"rescan|{dir_path}|{index}",
+                                        replace_existing=True,
+                                        name=f"短剧监控补扫 {dir_path}")
+            except Exception as e:
+                logger.error(f"{dir_path} 添加补扫任务失败：{str(e)}")
+                return
+        logger.debug(f"{dir_path} 已添加 {len(delays)} 次补扫")
+
+    def __rescan_dir(self, source_dir: str, dir_path: str):
+        """
+        定向补扫目录，未处理的文件按新建事件入队，由事件队列合并重复事件并等待写入完成
+        :param source_dir: 监控目录
+        :param dir_path: 补扫目录
+        """
+        if not self._event_queue or not os.path.isdir(dir_path):
+            return
+        count = 0
+        for entry in walk_files(root=dir_path, extensions=settings.RMT_MEDIAEXT, exclude=self.__exclude_reason):
+            try:
+                stat = entry.stat()
+            except OSError:
+                # 扫描后文件已被移动或删除
+                continue
+            if self._processed_index.is_processed(entry.path, stat):
+                continue
+            self._event_queue.put(event=FileCreatedEvent(entry.path), source_dir=source_dir, event_path=entry.path)
+            count += 1
+        if count:
+            logger.info(f"补扫 {dir_path} 发现未处理文件 {count} 个")
+
+    def __rescan_roots(self):
+        """
+        定时补扫按深度监控的目录，处理监控深度以外已有目录中新增的文件
+        """
+        if not self._observers:
+            return
+        for source_dir in self._observers.budgeted_paths():
+            self.__rescan_dir(source_dir=source_dir, dir_path=source_dir)
+
+    def __exclude_reason(self, path: str) -> Optional[str]:
+        """
+        判断路径是否需要排除
+        :param path: 文件或目录路径
+        :return: 排除原因，不排除时返回None
+        """
+        return self._path_filter.exclude_reason(path)
+
+    def __submit_file(self, is_directory: bool, event_path: str, source_dir: str):
+        """
+        提交文件到识别阶段，按剧集目录分片，同一剧集的文件按顺序处理
+        :param is_directory: 是否目录
         :param event_path: 事件文件路径
         :param source_dir: 监控目录
         """
+        series_key = self.__series_key(event_path=event_path, source_dir=source_dir)
+        if self._batcher and self._pipeline and not is_directory:
+            # 整季批量入库，同一剧集的文件汇总后一起处理
+            self._batcher.add(key=(source_dir, series_key), item=event_path)
+            return
+        self.__submit_stage("recognize", series_key, self.__process_file,
+                            is_directory=is_directory,
+                            event_path=event_path,
+                            source_dir=source_dir,
+                            series_key=series_key)
+
+    def __submit_stage(self, stage: str, key: str, func, **kwargs):
+        """
+        提交任务到流水线的指定阶段，流水线未启动时直接执行；
+        正在停止服务时不再执行，识别和转移阶段的任务记录源文件，刮削阶段由待刮削记录恢复
+        :param stage: 阶段 recognize/transfer/artwork
+        :param key: 分片键
+        :param func: 任务函数
+        """
+        pipeline = self._pipeline
+        if not pipeline and not self._stopping:
+            func(**kwargs)
+            return
+        if pipeline and pipeline.submit(stage, key, func, **kwargs):
+            return
+        if stage != "artwork":
+            self.__defer_files(self.__task_files(kwargs), reason="服务正在停止")
+
+    def __submit_batch(self, key: Tuple[str, str], files: Set[str]):
+        """
+        剧集文件汇总完成，提交到识别阶段
+        :param key: (监控目录, 剧集分片键)
+        :param files: 剧集文件
+        """
+        source_dir, series_key = key
+        if not self._pipeline:
+            return
+        if len(files) == 1:
+            self.__submit_stage("recognize", series_key, self.__process_file,
+                                is_directory=False,
+                                event_path=next(iter(files)),
+                                source_dir=source_dir,
+                                series_key=series_key)
+            return
+        self.__submit_stage("recognize", series_key, self.__process_batch,
+                            source_dir=source_dir,
+                            series_key=series_key,
+                            files=files)
+
+    def __process_batch(self, source_dir: str, series_key: str, files: Set[str]):
+        """
+        整季批量处理
+        识别和剧集信息查询按剧集缓存只执行一次，文件依次转移，转移期间不刮削；全部转移完成后每个季目录刮削一次元数据，
+        剧集级图片和NFO只生成一次，分集NFO和图片在刮削目录时逐个生成
+        :param source_dir: 监控目录
+        :param series_key: 剧集分片键
+        :param files: 同一剧集的文件
+        """
+        file_paths = sorted(files)
+        logger.info(f"{Path(file_paths[0]).parent} 开始批量处理 {len(file_paths)} 个文件")
+        jobs: List[FileJob] = []
+        for event_path in file_paths:
+            if not os.path.exists(event_path):
+                logger.debug(f"{event_path} 已不存在，跳过处理")
+                continue
+            job = self.__recognize_file(is_directory=False,
+                                        event_path=event_path,
+                                        source_dir=source_dir,
+                                        series_key=series_key,
+                                        scrape=False)
+            if job:
+                jobs.append(job)
+                self.__submit_stage("transfer", series_key, self.__transfer_stage, job=job)
+        if jobs:
+            # 同一分片键的任务按提交顺序执行，本剧集的文件全部转移后再按季目录刮削
+            self.__submit_stage("transfer", series_key, self.__finish_batch, jobs=jobs)
+
+    def __finish_batch(self, jobs: List[FileJob]):
+        """
+        批量转移完成，按季目录提交刮削
+        :param jobs: 同一剧集的文件任务
+        """
+        # 季目录 -> [(源文件, 目标文件)]
+        transferred: Dict[Path, List[Tuple[str, Path]]] = {}
+        for job in jobs:
+            if job.outcome == "transferred" and job.target:
+                transferred.setdefault(Path(job.target).parent, []).append((job.event_path, Path(job.target)))
+        for dir_path, targets in transferred.items():
+            self.__submit_stage("artwork", str(self.__series_dir(dir_path)), self.__scrape_dir,
+                                dir_path=dir_path,
+                                targets=targets)
+        self._metrics.incr("batches")
+        logger.info(f"{Path(jobs[0].event_path).parent} 批量转移完成")
+
+    def __series_key(self, event_path: str, source_dir: str) -> str:
+        """
+        计算文件所属剧集的目标目录，作为线程池分片键
+        智能重命名时不同源目录可能对应同一目标目录，按重命名规则计算，结果由目标路径计算缓存
+        """
+        resolved = self._resolver.resolve_dir(source_dir=source_dir,
+                                              dir_path=str(Path(event_path).parent)) if self._resolver else None
+        if resolved:
+            return str(resolved[1])
+        return str(Path(event_path).parent)
+
+    def __process_file(self, is_directory: bool, event_path: str, source_dir: str, series_key: str):
+        """
+        识别阶段任务，识别完成后提交到转移阶段
+        :param is_directory: 是否目录
+        :param event_path: 事件文件路径
+        :param source_dir: 监控目录
+        :param series_key: 剧集分片键
+        """
+        job = self.__recognize_file(is_directory=is_directory,
+                                    event_path=event_path,
+                                    source_dir=source_dir,
+                                    series_key=series_key)
+        if job:
+            self.__submit_stage("transfer", series_key, self.__transfer_stage, job=job)
+
+    def __transfer_stage(self, job: FileJob):
+        """
+        转移阶段任务，转移完成即视为处理完成，图片和NFO提交到刮削阶段异步生成
+        :param job: 文件任务
+        """
+        outcome = self.__transfer_file(job)
+        if outcome == "linked" or (outcome == "transferred" and job.scrape):
+            # 按剧集目录分片，同一剧集各季的图片和NFO按顺序生成，避免同时写入剧集级文件
+            self.__submit_stage("artwork", str(self.__series_dir(Path(job.target).parent)),
+                                self.__artwork_stage, job=job)
+
+    def __artwork_stage(self, job: FileJob):
+        """
+        刮削阶段任务，生成图片和NFO
+        :param job: 文件任务
+        """
+        try:
+            if job.outcome == "transferred":
+                self.__scrape_metadata(target_path=job.target,
+                                       mediainfo=job.mediainfo,
+                                       file_meta=job.file_meta,
+                                       episodes_info=job.episodes_info)
+            else:
+                self.__gen_artwork(job)
+        except Exception as e:
+            logger.error(f"{job.target} 生成图片和NFO失败：{str(e)}")
+        finally:
+            self.__artwork_done(job.event_path)
+
+    def __artwork_done(self, event_path: str):
+        """
+        图片和NFO生成结束，失败的也不再重试，只有停止插件时丢弃的任务在下次启动时重新提交
+        """
+        self._artwork_queued.discard(event_path)
+        if self._processed_index:
+            self._processed_index.clear_artwork_pending(event_path)
+
+    def __resume_pending(self):
+        """
+        恢复上次停止插件时未完成的任务
+        """
+        self.__replay_files()
+        self.__requeue_artwork()
+
+    def __replay_files(self):
+        """
+        重新提交停止插件时尚未处理的文件，经事件队列等待写入完成，已处理的文件跳过
+        """
+        if not self._processed_index:
+            return
+        replayed = 0
+        for event_path, source_dir in self._processed_index.pop_pending_files():
+            if source_dir not in self._dirconf or not os.path.exists(event_path) \
+                    or self._processed_index.is_processed(event_path):
+                continue
+            if self._event_queue:
+                self._event_queue.put(event=FileCreatedEvent(event_path), source_dir=source_dir,
+                                      event_path=event_path)
+            else:
+                self.__submit_file(is_directory=False, event_path=event_path, source_dir=source_dir)
+            replayed += 1
+        if replayed:
+            logger.info(f"重新提交上次停止时未处理的文件 {replayed} 个")
+
+    @staticmethod
+    def __to_int(value: Any, default: int, name: str, minimum: int = 1) -> int:
+        """
+        解析数值配置，未填写时使用默认值，无效或小于最小值时记录警告并使用默认值
+        :param value: 配置值
+        :param default: 默认值
+        :param name: 配置名称，用于日志
+        :param minimum: 允许的最小值
+        """
+        if value is None or str(value).strip() == "":
+            return default
+        try:
+            num = int(str(value).strip())
+        except ValueError:
+            logger.warn(f"{name}配置 {value} 不是有效的整数，使用默认值 {default}")
+            return default
+        if num < minimum:
+            logger.warn(f"{name}配置 {value} 小于 {minimum}，使用默认值 {default}")
+            return default
+        return num
+
+    @staticmethod
+    def __task_files(kwargs: dict) -> List[Tuple[str, str]]:
+        """
+        识别和转移阶段任务对应的源文件
+        :return: [(源文件, 监控目录)]
+        """
+        if kwargs.get("job"):
+            jobs = [kwargs["job"]]
+        elif kwargs.get("jobs"):
+            jobs = kwargs["jobs"]
+        elif kwargs.get("files"):
+            return [(file_path, kwargs.get("source_dir")) for file_path in kwargs["files"]]
+        elif kwargs.get("event_path") and not kwargs.get("is_directory"):
+            return [(kwargs["event_path"], kwargs.get("source_dir"))]
+        else:
+            return []
+        return [(job.event_path, job.source_dir) for job in jobs if not job.is_directory]
+
+    def __defer_files(self, files: List[Tuple[str, str]], reason: str):
+        """
+        记录未处理的文件，下次启动时重新提交
+        :param files: [(源文件, 监控目录)]
+        :param reason: 日志说明
+        """
+        if not files or not self._processed_index:
+            return
+        self._processed_index.record_pending_files(files)
+        logger.info(f"{reason}，{len(files)} 个文件将在下次启动时重新处理")
+
+    def __requeue_artwork(self):
+        """
+        重新提交已转移但图片和NFO尚未生成的文件，如停止插件时仍在刮削队列中的文件
+        """
+        if not self._processed_index or not self._pipeline:
+            return
+        requeued = 0
+        for event_path, source_dir, outcome, target in self._processed_index.pending_artwork():
+            if event_path in self._artwork_queued:
+                continue
+            try:
+                job = self.__pending_job(event_path=event_path, source_dir=source_dir,
+                                         outcome=outcome, target=target)
+            except Exception as e:
+                logger.error(f"{event_path} 恢复刮削任务失败：{str(e)}")
+                job = None
+            if not job:
+                self.__artwork_done(event_path)
+                continue
+            self._artwork_queued.add(event_path)
+            self.__submit_stage("artwork", str(self.__series_dir(Path(job.target).parent)),
+                                self.__artwork_stage, job=job)
+            requeued += 1
+        if requeued:
+            logger.info(f"重新提交 {requeued} 个文件的图片和NFO生成")
+
+    def __pending_job(self, event_path: str, source_dir: str, outcome: str, target: str) -> Optional[FileJob]:
+        """
+        按待刮削记录恢复文件任务，监控目录已删除、目标文件已不存在或无法识别时返回None
+        """
+        if source_dir not in self._dirconf or not target or not Path(target).exists():
+            return None
+        job = FileJob(is_directory=False,
+                      event_path=event_path,
+                      source_dir=source_dir,
+                      series_key=str(Path(target).parent))
+        job.outcome = outcome
+        job.target = Path(target)
+        if outcome == "transferred":
+            # 源文件可能已移动，只按路径解析元数据，识别结果按剧集缓存
+            job.file_meta = MetaInfoPath(Path(event_path))
+            job.mediainfo = self.__recognize_media(event_path=event_path, file_meta=job.file_meta)
+            return job if job.mediainfo else None
+        resolved = self._resolver.resolve(source_dir=source_dir, event_path=event_path)
+        if not resolved:
+            return None
+        job.title = resolved[0]
+        return job
+
+    def __record(self, job: FileJob, outcome: Optional[str]):
+        """
+        记录处理结果
+        :param job: 文件任务
+        :param outcome: 处理结果 transferred、linked、exists、failed，目录为None
+        """
+        job.outcome = outcome
+        if not outcome:
+            return
+        self._metrics.incr(f"files_{outcome}")
+        # 转移成功的文件同时记录为图片和NFO待生成，刮削阶段完成后移除，停止插件时丢弃的任务下次启动时重新提交
+        artwork = outcome in ("transferred", "linked")
+        if artwork:
+            self._artwork_queued.add(job.event_path)
+        if job.file_key and self._processed_index:
+            self._processed_index.record(file_path=job.event_path,
+                                         outcome=outcome,
+                                         target=str(job.target) if job.target else None,
+                                         key=job.file_key,
+                                         artwork_source_dir=job.source_dir if artwork else None)
+
+    def __recognize_file(self, is_directory: bool, event_path: str, source_dir: str, series_key: str,
+                         scrape: bool = True) -> Optional[FileJob]:
+        """
+        识别一个文件，识别结果按剧集缓存
+        :param is_directory: 是否目录
+        :param event_path: 事件文件路径
+        :param source_dir: 监控目录
+        :param series_key: 剧集分片键
+        :param scrape: 转移后是否刮削元数据，批量处理时由调用方按目录刮削
+        :return: 文件任务，无法识别时记录失败并返回None
+        """
+        # 处理前计算文件键，移动方式转移后源文件已不存在
+        job = FileJob(is_directory=is_directory,
+                      event_path=event_path,
+                      source_dir=source_dir,
+                      series_key=series_key,
+                      file_key=None if is_directory else ProcessedIndex.file_key(event_path),
+                      scrape=scrape)
         try:
-            # 转移路径
-            dest_dir = self._dirconf.get(source_dir)
-            # 是否重命名
-            rename_conf = self._renameconf.get(source_dir)
-            # 封面比例
-            cover_conf = self._coverconf.get(source_dir)
             # 元数据
-            file_meta = MetaInfoPath(Path(event_path))
-            if not file_meta.name:
+            job.file_meta = MetaInfoPath(Path(event_path))
+            if not job.file_meta.name:
                 logger.error(f"{Path(event_path).name} 无法识别有效信息")
-                return
-            # 识别媒体信息
-            mediainfo: MediaInfo = self.chain.recognize_media(meta=file_meta)
-
-            transfer_flag = False
-            title = None
-            # 走tmdb刮削
-            if mediainfo:
+                self.__record(job, "failed")
+                return None
+            # 识别媒体信息，同一剧集只识别一次
+            job.mediainfo = self.__recognize_media(event_path=event_path, file_meta=job.file_meta)
+            if job.mediainfo:
                 try:
-                    # 更新媒体图片
-                    self.chain.obtain_images(mediainfo=mediainfo)
-                    episodes_info = self.tmdbchain.tmdb_episodes(tmdbid=mediainfo.tmdb_id,
-                                                                 season=file_meta.begin_season or 1)
-                    mediainfo.category = ""
-                    # 转移
-                    transferinfo: TransferInfo = self.chain.transfer(mediainfo=mediainfo,
-                                                                     path=Path(event_path),
-                                                                     transfer_type=self._transfer_type,
-                                                                     target=Path(dest_dir),
-                                                                     meta=file_meta,
-                                                                     episodes_info=episodes_info)
-                    if not transferinfo:
-                        logger.error("文件转移模块运行失败")
-                        transfer_flag = False
-                    else:
-                        self.chain.scrape_metadata(path=transferinfo.target_path,
-                                                   mediainfo=mediainfo,
-                                                   transfer_type=self._transfer_type)
-                        transfer_flag = True
+                    job.episodes_info = self.__tmdb_episodes(tmdbid=job.mediainfo.tmdb_id,
+                                                             season=job.file_meta.begin_season or 1)
                 except Exception as e:
-                    print(str(e))
-                    transfer_flag = False
-                    logger.error(f"{event_path} tmdb刮削失败")
-                # 广播事件
-                # self.eventmanager.send_event(EventType.TransferComplete, {
-                #     'meta': file_meta,
-                #     'mediainfo': mediainfo,
-                #     'transferinfo': transferinfo
-                # })
-            if not transfer_flag:
-                target_path = event_path.replace(source_dir, dest_dir)
-
-                # 目录重命名
-                if str(rename_conf) == "true" or str(rename_conf) == "false":
-                    rename_conf = bool(rename_conf)
-                    target = target_path.replace(dest_dir, "")
-                    parent = Path(Path(target).parents[0])
-                    last = target.replace(str(parent), "")
-                    if rename_conf:
-                        # 自定义识别次
-                        title, _ = WordsMatcher().prepare(parent)
-                        target_path = Path(dest_dir).joinpath(title + last)
-                    else:
-                        title = parent
-                else:
-                    if str(rename_conf) == "smart":
-                        target = target_path.replace(dest_dir, "")
-                        parent = Path(Path(target).parents[0])
-                        last = target.replace(str(parent), "")
-                        # 取.第一个
-                        title = Path(parent).name.split(".")[0]
-                        target_path = Path(dest_dir).joinpath(title + last)
-                    else:
-                        logger.error(f"{target_path} 智能重命名失败")
-                        return
-
-                # 文件夹同步创建
-                if is_directory:
-                    # 目标文件夹不存在则创建
-                    if not Path(target_path).exists():
-                        logger.info(f"创建目标文件夹 {target_path}")
-                        os.makedirs(target_path)
-                else:
-                    # 媒体重命名
-                    try:
-                        pattern = r'S\d+E\d+'
-                        matches = re.search(pattern, Path(target_path).name)
-                        if matches:
-                            target_path = Path(
-                                target_path).parent / f"{matches.group()}{Path(Path(target_path).name).suffix}"
-                        else:
-                            print("未找到匹配的季数和集数")
-                    except Exception as e:
-                        print(e)
-
-                    # 目标文件夹不存在则创建
-                    if not Path(target_path).parent.exists():
-                        logger.info(f"创建目标文件夹 {Path(target_path).parent}")
-                        os.makedirs(Path(target_path).parent)
-
-                    # 文件：nfo、图片、视频文件
-                    if Path(target_path).exists():
-                        logger.debug(f"目标文件 {target_path} 已存在")
-                        return
-
-                    # 硬链接
-                    retcode = self.__transfer_command(file_item=Path(event_path),
-                                                      target_file=target_path,
-                                                      transfer_type=self._transfer_type)
-                    if retcode == 0:
-                        logger.info(f"文件 {event_path} 硬链接完成")
-                        # 生成 tvshow.nfo
-                        if not (target_path.parent / "tvshow.nfo").exists():
-                            self.__gen_tv_nfo_file(dir_path=target_path.parent,
-                                                   title=title)
-
-                        # 生成缩略图
-                        if not (target_path.parent / "poster.jpg").exists():
-                            thumb_path = self.gen_file_thumb(title=title,
-                                                             rename_conf=rename_conf,
-                                                             file_path=target_path)
-                            if thumb_path and Path(thumb_path).exists():
-                                self.__save_poster(input_path=thumb_path,
-                                                   poster_path=target_path.parent / "poster.jpg",
-                                                   cover_conf=cover_conf)
-                                if (target_path.parent / "poster.jpg").exists():
-                                    logger.info(f"{target_path.parent / 'poster.jpg'} 缩略图已生成")
-                                thumb_path.unlink()
-                            else:
-                                # 检查是否有缩略图
-                                thumb_files = SystemUtils.list_files(directory=target_path.parent,
-                                                                     extensions=[".jpg"])
-                                if thumb_files:
-                                    # 生成poster
-                                    for thumb in thumb_files:
-                                        self.__save_poster(input_path=thumb,
-                                                           poster_path=target_path.parent / "poster.jpg",
-                                                           cover_conf=cover_conf)
-                                        break
-                                    # 删除多余jpg
-                                    for thumb in thumb_files:
-                                        Path(thumb).unlink()
-                    else:
-                        logger.error(f"文件 {event_path} 硬链接失败，错误码：{retcode}")
-            if self._notify:
-                # 发送消息汇总
-                media_list = self._medias.get(mediainfo.title_year if mediainfo else title) or {}
-                if media_list:
-                    media_files = media_list.get("files") or []
-                    if media_files:
-                        if str(event_path) not in media_files:
-                            media_files.append(str(event_path))
-                    else:
-                        media_files = [str(event_path)]
-                    media_list = {
-                        "files": media_files,
-                        "time": datetime.datetime.now()
-                    }
-                else:
-                    media_list = {
-                        "files": [str(event_path)],
-                        "time": datetime.datetime.now()
-                    }
-                self._medias[mediainfo.title_year if mediainfo else title] = media_list
+                    # 按重命名规则硬链接
+                    logger.error(f"{event_path} 查询TMDB剧集信息失败：{str(e)}")
+                    job.mediainfo = None
+            return job
+        except Exception as e:
+            logger.error(f"{event_path} 识别失败：{str(e)}")
+            self.__record(job, "failed")
+            return None
+
+    def __transfer_file(self, job: FileJob) -> Optional[str]:
+        """
+        转移一个文件并记录处理结果
+        识别到TMDB时按TMDB转移，未识别到或转移失败时按重命名规则硬链接
+        :param job: 文件任务
+        :return: 处理结果 transferred、linked、exists、failed，目录返回None
+        """
+        outcome = None
+        try:
+            if job.mediainfo:
+                outcome = self.__transfer_tmdb(job)
+            if not outcome:
+                outcome = self.__transfer_link(job)
+        except Exception as e:
+            logger.error(f"{job.event_path} 转移失败：{str(e)}")
+            outcome = "failed"
+        self.__record(job, outcome)
+        if self._notifier and outcome in ("transferred", "linked"):
+            # 发送消息汇总
+            self._notifier.add(key=str(job.mediainfo.title_year if outcome == "transferred" else job.title),
+                               item=str(job.event_path))
+        return outcome
+
+    def __transfer_tmdb(self, job: FileJob) -> Optional[str]:
+        """
+        按TMDB识别结果转移
+        :return: 转移成功返回 transferred，失败返回None
+        """
+        try:
+            with self._metrics.timer("transfer") as timer:
+                transferinfo: TransferInfo = self.chain.transfer(mediainfo=job.mediainfo,
+                                                                 path=Path(job.event_path),
+                                                                 transfer_type=self._transfer_type,
+                                                                 target=Path(self._dirconf.get(job.source_dir)),
+                                                                 meta=job.file_meta,
+                                                                 episodes_info=job.episodes_info)
+                if not transferinfo:
+                    timer.fail()
         except Exception as e:
-            logger.error(f"event_handler_created error: {e}")
-            print(str(e))
+            logger.error(f"{job.event_path} tmdb刮削失败：{str(e)}")
+            return None
+        if not transferinfo:
+            logger.error("文件转移模块运行失败")
+            return None
+        # 广播事件
+        # self.eventmanager.send_event(EventType.TransferComplete, {
+        #     'meta': file_meta,
+        #     'mediainfo': mediainfo,
+        #     'transferinfo': transferinfo
+        # })
+        job.target = transferinfo.target_path
+        return "transferred"
+
+    def __transfer_link(self, job: FileJob) -> Optional[str]:
+        """
+        按重命名规则硬链接，目录只创建目标目录
+        :return: 处理结果 linked、exists、failed，目录返回None
+        """
+        # 目录重命名及媒体重命名，同一剧集目录的结果已缓存
+        if job.is_directory:
+            resolved = self._resolver.resolve_dir(source_dir=job.source_dir, dir_path=job.event_path)
+        else:
+            resolved = self._resolver.resolve(source_dir=job.source_dir, event_path=job.event_path)
+        if not resolved:
+            logger.error(f"{job.event_path} 智能重命名失败")
+            return "failed"
+        job.title, target_path = resolved
+
+        # 文件夹同步创建
+        if job.is_directory:
+            # 目标文件夹不存在则创建
+            if not Path(target_path).exists():
+                logger.info(f"创建目标文件夹 {target_path}")
+                os.makedirs(target_path)
+            return None
+
+        # 目标文件夹不存在则创建
+        if not Path(target_path).parent.exists():
+            logger.info(f"创建目标文件夹 {Path(target_path).parent}")
+            os.makedirs(Path(target_path).parent)
+
+        job.target = target_path
+        # 文件：nfo、图片、视频文件
+        if Path(target_path).exists():
+            logger.debug(f"目标文件 {target_path} 已存在")
+            return "exists"
+
+        # 硬链接
+        with self._metrics.timer("transfer") as timer:
+            retcode = self.__transfer_command(file_item=Path(job.event_path),
+                                              target_file=target_path,
+                                              transfer_type=self._transfer_type)
+            if retcode != 0:
+                timer.fail()
+        if retcode != 0:
+            logger.error(f"文件 {job.event_path} 硬链接失败，错误码：{retcode}")
+            return "failed"
+        logger.info(f"文件 {job.event_path} 硬链接完成")
+        return "linked"
 
-    def send_msg(self):
+    def __gen_artwork(self, job: FileJob):
         """
-        定时检查是否有媒体处理完，发送统一消息
+        硬链接的文件生成NFO和海报
+        :param job: 文件任务
         """
-        if self._notify:
-            if not self._medias or not self._medias.keys():
+        target_path = Path(job.target)
+        title = job.title
+        # 是否重命名
+        rename_conf = self._renameconf.get(job.source_dir)
+        # 封面比例
+        cover_conf = self._coverconf.get(job.source_dir)
+        # 生成 tvshow.nfo，新剧集目录同时批量生成已有分集的NFO
+        if not (target_path.parent / "tvshow.nfo").exists():
+            self.__gen_tv_nfo_file(dir_path=target_path.parent,
+                                   title=title)
+            self._nfo_writer.write_episodes(dir_path=target_path.parent,
+                                            title=str(title))
+        else:
+            # 生成分集NFO
+            self._nfo_writer.write_episode(video_path=target_path,
+                                           title=str(title))
+
+        # 生成缩略图
+        if not (target_path.parent / "poster.jpg").exists():
+            if self.gen_file_poster(title=title,
+                                    rename_conf=rename_conf,
+                                    file_path=target_path,
+                                    cover_conf=cover_conf):
+                logger.info(f"{target_path.parent / 'poster.jpg'} 缩略图已生成")
+            else:
+                # 检查是否有缩略图
+                thumb_files = SystemUtils.list_files(directory=target_path.parent,
+                                                     extensions=[".jpg"])
+                if thumb_files:
+                    # 生成poster
+                    for thumb in thumb_files:
+                        self.__save_poster(input_path=thumb,
+                                           poster_path=target_path.parent / "poster.jpg",
+                                           cover_conf=cover_conf)
+                        break
+                    # 删除多余jpg
+                    for thumb in thumb_files:
+                        Path(thumb).unlink()
+
+    def __scrape_dir(self, dir_path: Path, targets: List[Tuple[str, Path]]):
+        """
+        批量处理时按季目录刮削元数据，识别结果和剧集信息已缓存
+        季目录已完整刮削过时逐集生成分集NFO和图片，否则整个目录刮削一次
+        :param dir_path: 季目录
+        :param targets: [(源文件, 目标文件)]
+        """
+        try:
+            event_path = targets[0][0]
+            file_meta = MetaInfoPath(Path(event_path))
+            mediainfo = self.__recognize_media(event_path=event_path, file_meta=file_meta)
+            if not mediainfo:
+                return
+            if self.__is_scraped(dir_path):
+                for source_path, target_path in targets:
+                    self.__scrape_metadata(target_path=target_path,
+                                           mediainfo=mediainfo,
+                                           file_meta=MetaInfoPath(Path(source_path)))
                 return
+            with self._metrics.timer("scrape_metadata"):
+                self.chain.scrape_metadata(path=dir_path,
+                                           mediainfo=mediainfo,
+                                           transfer_type=self._transfer_type)
+            self.__mark_scraped(dir_path=dir_path, mediainfo=mediainfo)
+        except Exception as e:
+            logger.error(f"{dir_path} 刮削元数据失败：{str(e)}")
+        finally:
+            for source_path, _ in targets:
+                self.__artwork_done(source_path)
 
-            # 遍历检查是否已刮削完，发送消息
-            for medis_title_year in list(self._medias.keys()):
-                media_list = self._medias.get(medis_title_year)
-                logger.info(f"开始处理媒体 {medis_title_year} 消息")
+    def __scrape_metadata(self, target_path: Path, mediainfo: MediaInfo, file_meta: MetaBase,
+                          episodes_info: Any = None):
+        """
+        刮削一个文件的元数据
+        季目录的剧集级图片和NFO已完整时只生成分集NFO和分集图片，否则完整刮削，完成后检查剧集级文件是否齐全并记录
+        :param target_path: 转移后的文件
+        :param mediainfo: 媒体信息
+        :param file_meta: 源文件元数据
+        :param episodes_info: TMDB剧集信息，为空时从缓存查询
+        """
+        dir_path = Path(target_path).parent
+        if self.__is_scraped(dir_path):
+            if episodes_info is None:
+                episodes_info = self.__tmdb_episodes(tmdbid=mediainfo.tmdb_id,
+                                                     season=file_meta.begin_season or 1)
+            if self.__scrape_episode(target_path=Path(target_path),
+                                     mediainfo=mediainfo,
+                                     file_meta=file_meta,
+                                     episodes_info=episodes_info):
+                self._metrics.incr("scrape_episode_only")
+                return
+        with self._metrics.timer("scrape_metadata"):
+            self.chain.scrape_metadata(path=target_path,
+                                       mediainfo=mediainfo,
+                                       transfer_type=self._transfer_type)
+        self.__mark_scraped(dir_path=dir_path, mediainfo=mediainfo)
+
+    def __scrape_episode(self, target_path: Path, mediainfo: MediaInfo, file_meta: MetaBase,
+                         episodes_info: Any) -> bool:
+        """
+        只生成分集NFO和分集图片，NFO字段与MoviePilot刮削的分集NFO一致，TMDB图片按系统代理下载
+        TmdbEpisode 没有分集编号，分集由剧集目录 tvshow.nfo 中的TMDB编号加季集定位
+        :return: 是否成功，无法确定集数或没有该集TMDB信息时返回False
+        """
+        episode_num = file_meta.begin_episode
+        if not episode_num:
+            return False
+        episode_info = next((episode for episode in episodes_info or []
+                             if getattr(episode, "episode_number", None) == episode_num), None)
+        if not episode_info:
+            # 没有该集的TMDB信息时改为完整刮削
+            return False
+        if not self._nfo_writer.write_episode(video_path=target_path,
+                                              title=mediainfo.title,
+                                              episode_info=episode_info) \
+                and not target_path.with_suffix(".nfo").exists():
+            return False
+        still_path = getattr(episode_info, "still_path", None)
+        thumb_path = target_path.with_name(f"{target_path.stem}-thumb.jpg")
+        if still_path and not thumb_path.exists():
+            try:
+                self.__save_image(url=f"https://{settings.TMDB_IMAGE_DOMAIN}/t/p/original{still_path}",
+                                  file_path=thumb_path,
+                                  proxies=settings.PROXY)
+            except Exception as e:
+                logger.error(f"{thumb_path} 分集图片下载失败：{str(e)}")
+        return True
 
-                if not media_list:
-                    continue
+    @staticmethod
+    def __series_dir(season_dir: Path) -> Path:
+        """
+        季目录所在的剧集目录，没有季目录时为其本身
+        """
+        if re.match(r"^(Season \d+|Specials)$", season_dir.name, re.IGNORECASE):
+            return season_dir.parent
+        return season_dir
 
-                # 获取最后更新时间
-                last_update_time = media_list.get("time")
-                media_files = media_list.get("files")
-                if not last_update_time or not media_files:
-                    continue
+    def __is_scraped(self, dir_path: Path) -> bool:
+        """
+        季目录是否已完整刮削，剧集NFO被删除时重新完整刮削
+        """
+        if not self._processed_index or not self._processed_index.is_dir_scraped(str(dir_path)):
+            return False
+        return (self.__series_dir(dir_path) / "tvshow.nfo").exists()
 
-                # 判断剧集最后更新时间距现在是已超过10秒或者电影，发送消息
-                if (datetime.datetime.now() - last_update_time).total_seconds() > int(self._interval):
-                    # 发送消息
-                    self.post_message(mtype=NotificationType.Organize,
-                                      title=f"{medis_title_year} 共{len(media_files)}集已入库",
-                                      text="类别：短剧")
-                    # 发送完消息，移出key
-                    del self._medias[medis_title_year]
-                    continue
+    def __mark_scraped(self, dir_path: Path, mediainfo: MediaInfo):
+        """
+        剧集级NFO和海报齐全时记录季目录已完整刮削，之后的分集只生成分集文件
+        """
+        if not self._processed_index:
+            return
+        series_dir = self.__series_dir(dir_path)
+        if not (series_dir / "tvshow.nfo").exists():
+            return
+        if getattr(mediainfo, "poster_path", None) \
+                and not any((series_dir / f"poster{ext}").exists() for ext in (".jpg", ".png", ".webp")):
+            return
+        self._processed_index.record_dir_scraped(str(dir_path))
+
+    def __recognize_media(self, event_path: str, file_meta: MetaBase) -> Optional[MediaInfo]:
+        """
+        识别媒体信息并获取媒体图片，结果按剧集（所在目录+识别名称+季）缓存
+        未识别到的结果同样缓存；识别出错或获取媒体图片失败时不缓存，下一个文件重新识别
+        """
+        cache_key = ("media",
+                     Path(event_path).parent.as_posix(),
+                     file_meta.name,
+                     file_meta.begin_season or 1)
+        hit, mediainfo = self._media_cache.get(cache_key)
+        if hit:
+            self._metrics.incr("recognition_cache_hit")
+            return mediainfo
+        self._metrics.incr("recognition_cache_miss")
+        with self._metrics.timer("recognition") as timer:
+            try:
+                mediainfo = self.chain.recognize_media(meta=file_meta)
+            except Exception as e:
+                # 网络等临时错误，不按未识别缓存
+                timer.fail()
+                logger.error(f"{file_meta.name} 识别媒体信息出错：{str(e)}")
+                return None
+            if mediainfo:
+                mediainfo.category = ""
+                try:
+                    # 更新媒体图片
+                    self.chain.obtain_images(mediainfo=mediainfo)
+                except Exception as e:
+                    # 没有图片的识别结果不缓存，避免该剧集之后都不生成图片
+                    timer.fail()
+                    logger.error(f"{mediainfo.title_year} 获取媒体图片失败：{str(e)}")
+                    return mediainfo
+        self._media_cache.set(cache_key, mediainfo)
+        return mediainfo
+
+    def __tmdb_episodes(self, tmdbid: int, season: int):
+        """
+        查询TMDB剧集信息，结果按tmdbid+季缓存
+        """
+        cache_key = ("episodes", tmdbid, season)
+        hit, episodes_info = self._media_cache.get(cache_key)
+        if hit:
+            return episodes_info
+        with self._metrics.timer("tmdb_episodes"):
+            episodes_info = self.tmdbchain.tmdb_episodes(tmdbid=tmdbid, season=season)
+        self._media_cache.set(cache_key, episodes_info or None)
+        return episodes_info
+
+    def __save_caches(self):
+        """
+        持久化识别缓存和封面缓存
+        """
+        if self._media_cache:
+            self._media_cache.save()
+        if self._cover_finder:
+            self._cover_finder.save_cache()
+
+    def send_msg(self, title: str, files: Set[str]):
+        """
+        剧集入库完成，发送统一消息
+        :param title: 标题
+        :param files: 入库的文件
+        """
+        logger.info(f"开始处理媒体 {title} 消息")
+        self.post_message(mtype=NotificationType.Organize,
+                          title=f"{title} 共{len(files)}集已入库",
+                          text="类别：短剧")
 
     @staticmethod
     def __transfer_command(file_item: Path, target_file: Path, transfer_type: str) -> int:
@@ -497,7 +1184,7 @@ class ShortPlayMonitor(_PluginBase):
         :param target_file: 目标文件路径
         :param transfer_type: RmtMode转移方式
         """
-        with lock:
+        with transfer_lock.get(Path(target_file).parent):
 
             # 转移
             if transfer_type == 'link':
@@ -524,99 +1211,36 @@ class ShortPlayMonitor(_PluginBase):
 
         return retcode
 
-    def __save_poster(self, input_path, poster_path, cover_conf):
+    @staticmethod
+    def __save_poster(input_path, poster_path, cover_conf):
         """
         截取图片做封面
         """
         try:
-            image = Image.open(input_path)
-
-            # 需要截取的长宽比（比如 16:9）
-            if not cover_conf:
-                target_ratio = 2 / 3
-            else:
-                covers = cover_conf.split(":")
-                target_ratio = int(covers[0]) / int(covers[1])
-
-            # 获取原始图片的长宽比
-            original_ratio = image.width / image.height
-
-            # 计算截取后的大小
-            if original_ratio > target_ratio:
-                new_height = image.height
-                new_width = int(new_height * target_ratio)
-            else:
-                new_width = image.width
-                new_height = int(new_width / target_ratio)
-
-            # 计算截取的位置
-            left = (image.width - new_width) // 2
-            top = (image.height - new_height) // 2
-            right = left + new_width
-            bottom = top + new_height
-
-            # 截取图片
-            cropped_image = image.crop((left, top, right, bottom))
-
-            # 保存截取后的图片
-            cropped_image.save(poster_path)
+            crop_poster(input_path=input_path, poster_path=poster_path, cover_conf=cover_conf)
         except Exception as e:
-            print(str(e))
+            logger.error(f"生成封面 {poster_path} 失败：{str(e)}")
 
     def __gen_tv_nfo_file(self, dir_path: Path, title: str):
         """
         生成电视剧的NFO描述文件
         :param dir_path: 电视剧根目录
         """
-        # 开始生成XML
         logger.info(f"正在生成电视剧NFO文件：{dir_path.name}")
-        doc = minidom.Document()
-        root = DomUtils.add_node(doc, doc, "tvshow")
-
-        # 标题
-        DomUtils.add_node(doc, root, "title", title)
-        DomUtils.add_node(doc, root, "originaltitle", title)
-        DomUtils.add_node(doc, root, "season", "-1")
-        DomUtils.add_node(doc, root, "episode", "-1")
-        # 保存
-        self.__save_nfo(doc, dir_path.joinpath("tvshow.nfo"))
-
-    def __save_nfo(self, doc, file_path: Path):
-        """
-        保存NFO
-        """
-        xml_str = doc.toprettyxml(indent="  ", encoding="utf-8")
-        file_path.write_bytes(xml_str)
-        logger.info(f"NFO文件已保存：{file_path}")
+        try:
+            self._nfo_writer.write_tvshow(dir_path=dir_path, title=str(title))
+        except OSError as e:
+            logger.error(f"生成电视剧NFO文件 {dir_path} 失败：{str(e)}")
 
     def gen_file_thumb_from_site(self, title: str, file_path: Path):
         """
         从agsv或者萝莉站查询封面
         """
         try:
-            image = None
-            # 查询索引
-            domain = "agsvpt.com"
-            site = SiteOper().get_by_domain(domain)
-            index = SitesHelper().get_indexer(domain)
-            if site:
-                req_url = f"https://www.agsvpt.com/torrents.php?search_mode=0&search_area=0&page=0&notnewword=1&cat=419&search={title}"
-                image_xpath = "//*[@id='kdescr']/img[1]/@src"
-                # 查询站点资源
-                logger.info(f"开始检索 {site.name} {title}")
-                image = self.__get_site_torrents(url=req_url, site=site, image_xpath=image_xpath, index=index)
-            if not image:
-                domain = "ilolicon.com"
-                site = SiteOper().get_by_domain(domain)
-                index = SitesHelper().get_indexer(domain)
-                if site:
-                    req_url = f"https://share.ilolicon.com/torrents.php?search_mode=0&search_area=0&page=0&notnewword=1&cat=402&search={title}"
-
-                    image_xpath = "//*[@id='kdescr']/img[1]/@src"
-                    # 查询站点资源
-                    logger.info(f"开始检索 {site.name} {title}")
-                    image = self.__get_site_torrents(url=req_url, site=site, image_xpath=image_xpath, index=index)
-
+            if not self._cover_finder:
+                return None
+            # 查询站点封面，结果按标题缓存，检索耗时和缓存命中在检索内部统计
+            image = self._cover_finder.find(title)
             if not image:
                 logger.error(f"检索站点 {title} 封面失败")
                 return None
@@ -630,19 +1254,23 @@ class ShortPlayMonitor(_PluginBase):
             return None
 
     @retry(RequestException, logger=logger)
-    def __save_image(self, url: str, file_path: Path):
+    def __save_image(self, url: str, file_path: Path, proxies: Optional[dict] = None):
         """
         下载图片并保存
+        :param proxies: 代理，TMDB图片与MoviePilot刮削一致使用系统代理，站点图片直连
         """
         try:
             logger.info(f"正在下载{file_path.stem}图片：{url} ...")
-            r = RequestUtils().get_res(url=url, raise_exception=True)
-            if r:
-                file_path.write_bytes(r.content)
+            # 流式下载到临时文件，完成后替换
+            with self._metrics.timer("image_download") as timer:
+                downloaded = self._image_downloader.download(url=url, file_path=file_path, proxies=proxies)
+                if not downloaded:
+                    timer.fail()
+            if downloaded:
                 logger.info(f"图片已保存：{file_path}")
                 return True
             else:
-                logger.info(f"{file_path.stem}图片下载失败，请检查网络连通性")
+                logger.info(f"{file_path.stem}图片下载失败")
                 return False
         except RequestException as err:
             raise err
@@ -650,118 +1278,33 @@ class ShortPlayMonitor(_PluginBase):
             logger.error(f"{file_path.stem}图片下载失败：{str(err)}")
             return False
 
-    def __get_site_torrents(self, url: str, site, image_xpath, index):
-        """
-        查询站点资源
-        """
-        page_source = self.__get_page_source(url=url, site=site)
-        if not page_source:
-            logger.error(f"请求站点 {site.name} 失败")
-            return None
-        _spider = TorrentSpider(indexer=index,
-                                page=1)
-        torrents = _spider.parse(page_source)
-        if not torrents:
-            logger.error(f"未检索到站点 {site.name} 资源")
-            return None
-
-        # 获取种子详情页
-        torrent_detail_source = self.__get_page_source(url=torrents[0].get("page_url"), site=site)
-        if not torrent_detail_source:
-            logger.error(f"请求种子详情页失败 {torrents[0].get('page_url')}")
-            return None
-
-        html = etree.HTML(torrent_detail_source)
-        if not html:
-            logger.error(f"请求种子详情页失败 {torrents[0].get('page_url')}")
-            return None
-
-        image = html.xpath(image_xpath)[0]
-        if not image:
-            logger.error(f"未获取到种子封面图 {torrents[0].get('page_url')}")
-            return None
-
-        return str(image)
-
-    def __get_page_source(self, url: str, site):
-        """
-        获取页面资源
+    def gen_file_poster(self, title: str, file_path: Path, rename_conf: str, cover_conf: str) -> bool:
         """
-        ret = RequestUtils(
-            cookies=site.cookie,
-            timeout=30,
-        ).get_res(url, allow_redirects=True)
-        if ret is not None:
-            # 使用chardet检测字符编码
-            raw_data = ret.content
-            if raw_data:
-                try:
-                    result = chardet.detect(raw_data)
-                    encoding = result['encoding']
-                    # 解码为字符串
-                    page_source = raw_data.decode(encoding)
-                except Exception as e:
-                    # 探测utf-8解码
-                    if re.search(r"charset=\"?utf-8\"?", ret.text, re.IGNORECASE):
-                        ret.encoding = "utf-8"
-                    else:
-                        ret.encoding = ret.apparent_encoding
-                    page_source = ret.text
-            else:
-                page_source = ret.text
-        else:
-            page_source = ""
-
-        return page_source
-
-    def gen_file_thumb(self, title: str, file_path: Path, rename_conf: str):
-        """
-        处理一个文件
+        生成剧集封面
+        智能重命名时优先从站点检索；否则由ffmpeg截图，截取的帧经管道在内存中裁剪，只写入poster.jpg
+        :return: 是否已生成
         """
+        poster_path = file_path.parent / "poster.jpg"
         # 智能重命名时从站点检索
         if str(rename_conf) == "smart":
-            thumb_path = file_path.with_name(file_path.stem + "-site.jpg")
-            if thumb_path.exists():
-                logger.info(f"缩略图已存在：{thumb_path}")
-                return
-            self.gen_file_thumb_from_site(title=title, file_path=thumb_path)
-            if Path(thumb_path).exists():
-                logger.info(f"{file_path} 缩略图已生成：{thumb_path}")
-                return thumb_path
-        # 单线程处理
-        with ffmpeg_lock:
-            try:
-                thumb_path = file_path.with_name(file_path.stem + "-thumb.jpg")
-                if thumb_path.exists():
-                    logger.info(f"缩略图已存在：{thumb_path}")
-                    return
-                self.get_thumb(video_path=str(file_path),
-                               image_path=str(thumb_path),
-                               frames=self._timeline)
-                if Path(thumb_path).exists():
-                    logger.info(f"{file_path} 缩略图已生成：{thumb_path}")
-                    return thumb_path
-            except Exception as err:
-                logger.error(f"FFmpeg处理文件 {file_path} 时发生错误：{str(err)}")
-                return None
-
-    @staticmethod
-    def get_thumb(video_path: str, image_path: str, frames: str = None):
-        """
-        使用ffmpeg从视频文件中截取缩略图
-        """
-        if not frames:
-            frames = "00:00:10"
-        if not video_path or not image_path:
+            site_path = file_path.with_name(file_path.stem + "-site.jpg")
+            if self.gen_file_thumb_from_site(title=title, file_path=site_path):
+                self.__save_poster(input_path=site_path, poster_path=poster_path, cover_conf=cover_conf)
+                site_path.unlink(missing_ok=True)
+                if poster_path.exists():
+                    return True
+        try:
+            # 限制并发数截取
+            with self._metrics.timer("ffmpeg") as timer:
+                frame = self._thumb_engine.grab(video_path=str(file_path), timelines=self._timelines)
+                if not frame:
+                    timer.fail()
+            if not frame:
+                return False
+            return save_poster(image=frame, poster_path=poster_path, cover_conf=cover_conf)
+        except Exception as err:
+            logger.error(f"FFmpeg处理文件 {file_path} 时发生错误：{str(err)}")
             return False
-        cmd = 'ffmpeg -y -i "{video_path}" -ss {frames} -frames 1 "{image_path}"'.format(
-            video_path=video_path,
-            frames=frames,
-            image_path=image_path)
-        result = SystemUtils.execute(cmd)
-        if result:
-            return True
-        return False
 
     def __update_config(self):
         """
@@ -775,6 +1318,17 @@ class ShortPlayMonitor(_PluginBase):
             "interval": self._interval,
             "notify": self._notify,
             "image": self._image,
+            "cache_persist": self._cache_persist,
+            "workers": self._workers,
+            "artwork_workers": self._artwork_workers,
+            "thumb_concurrency": self._thumb_concurrency,
+            "thumb_timeout": self._thumb_timeout,
+            "timeline": self._timeline,
+            "catchup": self._catchup,
+            "batch": self._batch,
+            "watch_depth": self._watch_depth,
+            "poll_max_interval": self._poll_max_interval,
+            "cover_sites": self._cover_sites,
             "monitor_confs": self._monitor_confs
         })
 
@@ -786,7 +1340,22 @@ class ShortPlayMonitor(_PluginBase):
         pass
 
     def get_api(self) -> List[Dict[str, Any]]:
-        pass
+        return [{
+            "path": "/status",
+            "endpoint": self.get_status,
+            "methods": ["GET"],
+            "auth": "bear",
+            "summary": "运行状态",
+            "description": "各处理阶段的调用次数、错误数、耗时分布及队列深度",
+        }]
+
+    def get_status(self) -> Dict[str, Any]:
+        """
+        API：运行状态
+        """
+        if not self._metrics:
+            return {}
+        return self._metrics.snapshot()
 
     def get_form(self) -> Tuple[List[dict], Dict[str, Any]]:
         """
@@ -872,7 +1441,60 @@ class ShortPlayMonitor(_PluginBase):
                                 'component': 'VCol',
                                 'props': {
                                     'cols': 12,
-                                    'md': 6
+                                    'md': 3
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VSwitch',
+                                        'props': {
+                                            'model': 'cache_persist',
+                                            'label': '持久化识别缓存',
+                                        }
+                                    }
+                                ]
+                            },
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 3
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VSwitch',
+                                        'props': {
+                                            'model': 'catchup',
+                                            'label': '启动时补处理',
+                                        }
+                                    }
+                                ]
+                            },
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 3
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VSwitch',
+                                        'props': {
+                                            'model': 'batch',
+                                            'label': '整季批量入库',
+                                        }
+                                    }
+                                ]
+                            },
+                        ]
+                    },
+                    {
+                        'component': 'VRow',
+                        'content': [
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 4
                                 },
                                 'content': [
                                     {
@@ -896,7 +1518,7 @@ class ShortPlayMonitor(_PluginBase):
                                 'component': 'VCol',
                                 'props': {
                                     'cols': 12,
-                                    'md': 6
+                                    'md': 4
                                 },
                                 'content': [
                                     {
@@ -908,6 +1530,135 @@ class ShortPlayMonitor(_PluginBase):
                                         }
                                     }
                                 ]
+                            },
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 4
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VTextField',
+                                        'props': {
+                                            'model': 'workers',
+                                            'label': '处理线程数',
+                                            'placeholder': '4'
+                                        }
+                                    }
+                                ]
+                            }
+                        ]
+                    },
+                    {
+                        'component': 'VRow',
+                        'content': [
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 3
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VTextField',
+                                        'props': {
+                                            'model': 'thumb_concurrency',
+                                            'label': '截图并发数',
+                                            'placeholder': '2'
+                                        }
+                                    }
+                                ]
+                            },
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 3
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VTextField',
+                                        'props': {
+                                            'model': 'thumb_timeout',
+                                            'label': '截图超时（秒）',
+                                            'placeholder': '60'
+                                        }
+                                    }
+                                ]
+                            },
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 3
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VTextField',
+                                        'props': {
+                                            'model': 'watch_depth',
+                                            'label': '监控深度',
+                                            'placeholder': '0为监控全部子目录'
+                                        }
+                                    }
+                                ]
+                            },
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 3
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VTextField',
+                                        'props': {
+                                            'model': 'poll_max_interval',
+                                            'label': '兼容模式最长轮询间隔（秒）',
+                                            'placeholder': '300'
+                                        }
+                                    }
+                                ]
+                            }
+                        ]
+                    },
+                    {
+                        'component': 'VRow',
+                        'content': [
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 9
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VTextField',
+                                        'props': {
+                                            'model': 'timeline',
+                                            'label': '截图时间点',
+                                            'placeholder': '多个时间点以英文逗号分隔，一次截取后选画面内容最丰富的一帧'
+                                        }
+                                    }
+                                ]
+                            },
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 3
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VTextField',
+                                        'props': {
+                                            'model': 'artwork_workers',
+                                            'label': '刮削线程数',
+                                            'placeholder': '2'
+                                        }
+                                    }
+                                ]
                             }
                         ]
                     },
@@ -955,6 +1706,29 @@ class ShortPlayMonitor(_PluginBase):
                             }
                         ]
                     },
+                    {
+                        'component': 'VRow',
+                        'content': [
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VTextarea',
+                                        'props': {
+                                            'model': 'cover_sites',
+                                            'label': '封面检索站点',
+                                            'rows': 2,
+                                            'placeholder': '站点域名#检索地址（标题用{title}代替）#封面XPath#并发数#请求间隔，'
+                                                           '每一行一个站点，留空默认AGSV、ilolicon'
+                                        }
+                                    }
+                                ]
+                            }
+                        ]
+                    },
                     {
                         'component': 'VRow',
                         'content': [
@@ -1026,19 +1800,163 @@ class ShortPlayMonitor(_PluginBase):
             "onlyonce": False,
             "image": False,
             "notify": False,
+            "cache_persist": False,
+            "catchup": False,
+            "batch": False,
+            "workers": 4,
+            "artwork_workers": 2,
+            "thumb_concurrency": 2,
+            "thumb_timeout": 60,
+            "timeline": "00:00:05,00:00:10,00:00:20,00:00:40",
+            "watch_depth": 0,
+            "poll_max_interval": 300,
             "interval": 10,
             "monitor_confs": "",
             "exclude_keywords": "",
+            "cover_sites": "",
             "transfer_type": "link"
         }
 
     def get_page(self) -> List[dict]:
-        pass
+        """
+        拼装插件详情页面，展示各处理阶段耗时及队列深度
+        """
+        if not self._metrics:
+            return [
+                {
+                    'component': 'div',
+                    'text': '暂无数据',
+                    'props': {
+                        'class': 'text-center',
+                    }
+                }
+            ]
+        snapshot = self._metrics.snapshot()
+        gauges = snapshot.get("gauges") or {}
+        counters = snapshot.get("counters") or {}
+        summary = [
+            ('事件队列', gauges.get("event_queue") or 0),
+            ('识别队列', gauges.get("recognize_queue") or 0),
+            ('转移队列', gauges.get("transfer_queue") or 0),
+            ('刮削队列', gauges.get("artwork_queue") or 0),
+            ('已转移', counters.get("files_transferred", 0) + counters.get("files_linked", 0)),
+            ('已存在', counters.get("files_exists", 0)),
+            ('失败', counters.get("files_failed", 0)),
+            ('识别缓存命中', f'{counters.get("recognition_cache_hit", 0)}'
+                       f'/{counters.get("recognition_cache_hit", 0) + counters.get("recognition_cache_miss", 0)}'),
+        ]
+        return [
+            {
+                'component': 'VRow',
+                'content': [
+                    {
+                        'component': 'VCol',
+                        'props': {
+                            'cols': 6,
+                            'md': 2
+                        },
+                        'content': [
+                            {
+                                'component': 'VCard',
+                                'props': {
+                                    'variant': 'tonal',
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VCardText',
+                                        'props': {
+                                            'class': 'text-center',
+                                        },
+                                        'content': [
+                                            {
+                                                'component': 'div',
+                                                'props': {
+                                                    'class': 'text-caption'
+                                                },
+                                                'text': name
+                                            },
+                                            {
+                                                'component': 'div',
+                                                'props': {
+                                                    'class': 'text-h6'
+                                                },
+                                                'text': str(value)
+                                            }
+                                        ]
+                                    }
+                                ]
+                            }
+                        ]
+                    } for name, value in summary
+                ]
+            },
+            {
+                'component': 'VRow',
+                'content': [
+                    {
+                        'component': 'VCol',
+                        'props': {
+                            'cols': 12,
+                        },
+                        'content': [
+                            {
+                                'component': 'VTable',
+                                'props': {
+                                    'hover': True
+                                },
+                                'content': [
+                                    {
+                                        'component': 'thead',
+                                        'content': [
+                                            {
+                                                'component': 'tr',
+                                                'content': [
+                                                    {
+                                                        'component': 'th',
+                                                        'props': {
+                                                            'class': 'text-start ps-4'
+                                                        },
+                                                        'text': header
+                                                    } for header in ['阶段', '次数', '错误', '平均(ms)',
+                                                                     'P50(ms)', 'P95(ms)', '最大(ms)']
+                                                ]
+                                            }
+                                        ]
+                                    },
+                                    {
+                                        'component': 'tbody',
+                                        'content': [
+                                            {
+                                                'component': 'tr',
+                                                'content': [
+                                                    {
+                                                        'component': 'td',
+                                                        'props': {
+                                                            'class': 'ps-4'
+                                                        },
+                                                        'text': str(value)
+                                                    } for value in [row.get("name"), row.get("count"),
+                                                                    row.get("errors"), row.get("avg_ms"),
+                                                                    row.get("p50_ms"), row.get("p95_ms"),
+                                                                    row.get("max_ms")]
+                                                ]
+                                            } for row in self._metrics.stage_rows()
+                                        ]
+                                    }
+                                ]
+                            }
+                        ]
+                    }
+                ]
+            }
+        ]
 
     def stop_service(self):
         """
         退出插件
+        先停止事件来源，再停止处理线程池，停止期间提交的任务只记录源文件，不在当前线程执行
         """
+        self._stopping = True
         try:
             if self._scheduler:
                 self._scheduler.remove_all_jobs()
@@ -1048,11 +1966,48 @@ class ShortPlayMonitor(_PluginBase):
         except Exception as e:
             logger.error("退出插件失败：%s" % str(e))
 
-        if self._observer:
-            for observer in self._observer:
-                try:
-                    observer.stop()
-                    observer.join()
-                except Exception as e:
-                    print(str(e))
-        self._observer = []
+        if self._observers:
+            self._observers.stop()
+            self._observers = None
+
+        if self._event_queue:
+            # 仍在等待写入完成的文件事件记录源文件，兼容模式的轮询快照已包含这些文件，不会再次产生事件
+            pending = self._event_queue.stop()
+            self._event_queue = None
+            self.__defer_files([(event_path, source_dir) for event_path, source_dir, event in pending
+                                if not event.is_directory],
+                               reason="文件事件队列已停止")
+
+        if self._batcher:
+            # 未开始处理的批次记录源文件，下次启动时重新提交
+            pending = self._batcher.stop(flush=False)
+            self._batcher = None
+            self.__defer_files([(file_path, source_dir) for (source_dir, _), files in pending
+                                for file_path in files],
+                               reason="整季批量汇总已停止")
+
+        if self._pipeline:
+            # 识别和转移阶段未执行的任务记录源文件，刮削阶段由待刮削记录恢复
+            dropped = self._pipeline.stop()
+            self._pipeline = None
+            self.__defer_files([file for stage, _, _, kwargs in dropped if stage != "artwork"
+                                for file in self.__task_files(kwargs)],
+                               reason="处理线程池已停止")
+
+        if self._notifier:
+            self._notifier.stop()
+            self._notifier = None
+
+        self.__save_caches()
+
+        if self._cover_finder:
+            self._cover_finder.close()
+            self._cover_finder = None
+
+        if self._image_downloader:
+            self._image_downloader.close()
+            self._image_downloader = None
+
+        if self._processed_index:
+            self._processed_index.close()
+            self._processed_index = None
@@ -0,0 +1,160 @@
+import heapq
+import itertools
+import threading
+import time
+from typing import Callable, Dict, Hashable, List, Optional, Set, Tuple
+
+from app.log import logger
+
+
+class _Pending:
+    """
+    同一键待汇总的条目
+    """
+    __slots__ = ("items", "first_time", "deadline")
+
+    def __init__(self, now: float):
+        self.items: Set[Hashable] = set()
+        self.first_time = now
+        self.deadline = now
+
+
+class DeadlineAggregator:
+    """
+    按键汇总
+    同一键在静默期内没有新条目时回调一次，如入库消息按标题汇总、整季文件按剧集合并处理；
+    使用截止时间堆，由一个线程在最近的截止时间到达时回调，不需要定时轮询
+    """
+
+    def __init__(self, callback: Callable[[Hashable, Set[Hashable]], None], quiet_period: float = 10,
+                 max_wait: float = 3600, max_keys: int = 1000, name: str = "ShortPlayMonitor-Aggregator"):
+        """
+        :param callback: 回调函数，参数为键和条目集合
+        :param quiet_period: 静默期（秒），键在此期间没有新条目则回调
+        :param max_wait: 键从第一个条目起最长等待时间（秒），超过后即使仍有新条目也回调
+        :param max_keys: 最多同时汇总的键数，超过时最早的键立即回调
+        :param name: 线程名称
+        """
+        self._callback = callback
+        self._quiet_period = quiet_period
+        self._max_wait = max_wait
+        self._max_keys = max_keys
+        self._pending: Dict[Hashable, _Pending] = {}
+        self._heap: List[Tuple[float, int, Hashable]] = []
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._thread = threading.Thread(target=self.__run, name=name, daemon=True)
+        self._thread.start()
+
+    def add(self, key: Hashable, item: Hashable):
+        """
+        记录一个条目
+        """
+        if not key:
+            return
+        overflow = []
+        with self._cond:
+            if self._stopped:
+                return
+            now = time.monotonic()
+            entry = self._pending.get(key)
+            if not entry:
+                entry = _Pending(now)
+                self._pending[key] = entry
+            entry.items.add(item)
+            entry.deadline = min(now + self._quiet_period, entry.first_time + self._max_wait)
+            heapq.heappush(self._heap, (entry.deadline, next(self._counter), key))
+            # 键过多时最早的键立即回调
+            while len(self._pending) > self._max_keys:
+                oldest = min(self._pending, key=lambda k: self._pending[k].first_time)
+                overflow.append((oldest, self._pending.pop(oldest).items))
+            self._cond.notify()
+        for overflow_key, items in overflow:
+            self.__send(overflow_key, items)
+
+    def flush(self):
+        """
+        未到截止时间的键立即回调
+        """
+        with self._cond:
+            pending = self.__pop_all()
+        for key, items in pending:
+            self.__send(key, items)
+
+    def stop(self, flush: bool = True) -> List[Tuple[Hashable, Set[Hashable]]]:
+        """
+        停止汇总
+        :param flush: 未回调的键是否立即回调，否则不再回调
+        :return: 未回调的键和条目，flush 时为空
+        """
+        with self._cond:
+            self._stopped = True
+            pending = self.__pop_all()
+            self._cond.notify()
+        if self._thread is not threading.current_thread():
+            self._thread.join(timeout=5)
+        if not flush:
+            return pending
+        for key, items in pending:
+            self.__send(key, items)
+        return []
+
+    def __pop_all(self) -> List[Tuple[Hashable, Set[Hashable]]]:
+        """
+        取出全部待回调的键
+        """
+        pending = [(key, entry.items) for key, entry in self._pending.items()]
+        self._pending.clear()
+        self._heap.clear()
+        return pending
+
+    def __run(self):
+        """
+        在截止时间到达时回调
+        """
+        while True:
+            with self._cond:
+                ready = self.__pop_ready()
+                while not ready:
+                    if self._stopped:
+                        return
+                    self._cond.wait(timeout=self.__next_timeout())
+                    ready = self.__pop_ready()
+            self.__send(*ready)
+
+    def __pop_ready(self) -> Optional[Tuple[Hashable, Set[Hashable]]]:
+        """
+        取出已到截止时间的键，跳过已过期的堆条目
+        """
+        now = time.monotonic()
+        while self._heap:
+            deadline, _, key = self._heap[0]
+            entry = self._pending.get(key)
+            if not entry or entry.deadline != deadline:
+                # 键已回调或截止时间已更新
+                heapq.heappop(self._heap)
+                continue
+            if deadline > now:
+                return None
+            heapq.heappop(self._heap)
+            del self._pending[key]
+            return key, entry.items
+        return None
+
+    def __next_timeout(self) -> Optional[float]:
+        """
+        距最近截止时间的秒数，没有待回调的键时无限等待
+        """
+        if not self._heap:
+            return None
+        return max(self._heap[0][0] - time.monotonic(), 0)
+
+    def __send(self, key: Hashable, items: Set[Hashable]):
+        """
+        回调
+        """
+        try:
+            self._callback(key, items)
+        except Exception as e:
+            logger.error(f"{key} 汇总处理失败：{str(e)}")
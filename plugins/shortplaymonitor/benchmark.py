@@ -0,0 +1,275 @@
+"""
+短剧刮削离线性能测试
+
+在临时目录生成 N 部剧 × M 集的模拟目录，使用可配置延迟的假 chain / TmdbChain / 站点检索及假 ffmpeg，
+输出全量同步吞吐、目录监控事件到文件转移完成的延迟和内存峰值。需在 MoviePilot 环境中运行：
+
+    python -m app.plugins.shortplaymonitor.benchmark --series 20 --episodes 50
+"""
+import argparse
+import json
+import os
+import resource
+import shutil
+import stat
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Dict, List, Optional, Tuple
+from unittest import mock
+
+from PIL import Image
+
+from app.schemas import TmdbEpisode
+
+from . import ShortPlayMonitor
+from . import site_cover
+
+# 假 ffmpeg，把预先生成的图片复制到输出路径，输出到管道时直接写出图片数据
+_FAKE_FFMPEG = """#!/bin/sh
+sleep {latency}
+cat "{frame}"
+"""
+
+
+class FakeChain:
+    """
+    假 chain，按固定延迟返回确定的结果
+    """
+
+    def __init__(self, latency: float, recognize: bool):
+        self._latency = latency
+        self._recognize = recognize
+        self.calls: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def __call(self, name: str):
+        with self._lock:
+            self.calls[name] = self.calls.get(name, 0) + 1
+        time.sleep(self._latency)
+
+    def recognize_media(self, meta, **kwargs):
+        self.__call("recognize_media")
+        if not self._recognize:
+            return None
+        return SimpleNamespace(title=meta.name, year="2024", title_year=f"{meta.name} (2024)",
+                               tmdb_id=abs(hash(meta.name)) % 100000, category="")
+
+    def obtain_images(self, mediainfo, **kwargs):
+        self.__call("obtain_images")
+        return mediainfo
+
+    def transfer(self, mediainfo, path: Path, target: Path, **kwargs):
+        self.__call("transfer")
+        target_path = target / mediainfo.title_year / "Season 1" / path.name
+        target_path.parent.mkdir(parents=True, exist_ok=True)
+        if not target_path.exists():
+            os.link(path, target_path)
+        return SimpleNamespace(target_path=target_path)
+
+    def scrape_metadata(self, path: Path, **kwargs):
+        self.__call("scrape_metadata")
+        # 写出剧集级文件，之后同一季的文件走只生成分集NFO的路径
+        season_dir = path if path.is_dir() else path.parent
+        series_dir = season_dir.parent if season_dir.name.startswith("Season") else season_dir
+        for name in ("tvshow.nfo", "poster.jpg"):
+            if not (series_dir / name).exists():
+                (series_dir / name).write_bytes(b"")
+
+
+class FakeTmdbChain:
+    """
+    假 TmdbChain
+    """
+
+    def __init__(self, latency: float):
+        self._latency = latency
+
+    def tmdb_episodes(self, tmdbid: int, season: int):
+        time.sleep(self._latency)
+        # 与 TmdbChain 返回的类型一致，没有分集图片以免访问网络
+        return [TmdbEpisode(air_date="2024-01-01", episode_number=episode, name=f"第{episode}集",
+                            overview="", season_number=season, still_path=None, vote_average=7.0,
+                            crew=[], guest_stars=[])
+                for episode in range(1, 201)]
+
+
+def make_tree(root: Path, series: int, episodes: int, prefix: str = "短剧",
+              created: Optional[Dict[str, float]] = None) -> List[Path]:
+    """
+    生成模拟目录：root/短剧NNN.2024/短剧NNN.S01EMM.mp4
+    :param created: 记录每个文件的创建时间
+    """
+    files = []
+    for s in range(series):
+        series_dir = root / f"{prefix}{s:03d}.2024"
+        series_dir.mkdir(parents=True, exist_ok=True)
+        for e in range(1, episodes + 1):
+            file_path = series_dir / f"{prefix}{s:03d}.S01E{e:02d}.mp4"
+            if created is not None:
+                created[str(file_path)] = time.perf_counter()
+            file_path.write_bytes(b"\0" * 1024)
+            files.append(file_path)
+    return files
+
+
+def make_fake_ffmpeg(bin_dir: Path, latency: float) -> Path:
+    """
+    生成假 ffmpeg 及其输出的图片
+    """
+    bin_dir.mkdir(parents=True, exist_ok=True)
+    frame = bin_dir / "frame.ppm"
+    Image.new("RGB", (320, 180), (90, 120, 150)).save(frame)
+    ffmpeg = bin_dir / "ffmpeg"
+    ffmpeg.write_text(_FAKE_FFMPEG.format(latency=latency, frame=frame))
+    ffmpeg.chmod(ffmpeg.stat().st_mode | stat.S_IEXEC)
+    return ffmpeg
+
+
+def build_plugin(workdir: Path, args) -> Tuple[ShortPlayMonitor, FakeChain]:
+    """
+    创建使用假依赖的插件实例
+    """
+    source, target, data = workdir / "source", workdir / "target", workdir / "data"
+    for path in (source, target, data):
+        path.mkdir(parents=True, exist_ok=True)
+    plugin = ShortPlayMonitor()
+    plugin.get_data_path = lambda *_args, **_kwargs: data
+    plugin.init_plugin({
+        "enabled": True,
+        "onlyonce": False,
+        "notify": False,
+        "workers": args.workers,
+        "artwork_workers": args.artwork_workers,
+        "batch": args.batch,
+        "transfer_type": "link",
+        "monitor_confs": f"fast#{source}#{target}#{args.rename}#2:3",
+    })
+    chain = FakeChain(latency=args.latency / 1000, recognize=not args.fallback)
+    plugin.chain = chain
+    plugin.tmdbchain = FakeTmdbChain(latency=args.latency / 1000)
+    return plugin, chain
+
+
+def bench_sync_all(plugin: ShortPlayMonitor, files: List[Path]) -> float:
+    """
+    全量同步吞吐（文件/秒）
+    """
+    start = time.perf_counter()
+    plugin.sync_all()
+    elapsed = time.perf_counter() - start
+    return len(files) / elapsed if elapsed else 0
+
+
+def bench_events(plugin: ShortPlayMonitor, source: Path, series: int, episodes: int,
+                 timeout: float) -> Optional[dict]:
+    """
+    目录监控事件到文件转移完成的延迟
+    """
+    created: Dict[str, float] = {}
+    done: Dict[str, float] = {}
+    total = series * episodes
+    finished = threading.Event()
+    transfer_file = plugin._ShortPlayMonitor__transfer_file
+
+    def _transfer_file(job):
+        # 转移完成即入库，图片和NFO在刮削阶段异步生成，不计入延迟
+        result = transfer_file(job)
+        done[job.event_path] = time.perf_counter()
+        if len(done) >= total:
+            finished.set()
+        return result
+
+    plugin._ShortPlayMonitor__transfer_file = _transfer_file
+    make_tree(source, series, episodes, prefix="事件", created=created)
+    finished.wait(timeout)
+    latencies = sorted(done[path] - created[path] for path in done if path in created)
+    if not latencies:
+        return None
+    return {
+        "events": len(created),
+        "done": len(latencies),
+        "p50_s": round(latencies[len(latencies) // 2], 3),
+        "p95_s": round(latencies[min(int(len(latencies) * 0.95), len(latencies) - 1)], 3),
+        "max_s": round(latencies[-1], 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="短剧刮削离线性能测试")
+    parser.add_argument("--series", type=int, default=10, help="剧集数")
+    parser.add_argument("--episodes", type=int, default=30, help="每部剧集数")
+    parser.add_argument("--latency", type=float, default=50, help="假 chain/TMDB 调用延迟（毫秒）")
+    parser.add_argument("--site-latency", type=float, default=200, help="假站点检索延迟（毫秒）")
+    parser.add_argument("--ffmpeg-latency", type=float, default=0.2, help="假 ffmpeg 耗时（秒）")
+    parser.add_argument("--workers", type=int, default=4, help="处理线程数")
+    parser.add_argument("--artwork-workers", type=int, default=2, help="刮削线程数")
+    parser.add_argument("--rename", default="smart", help="重命名方式 true/false/smart")
+    parser.add_argument("--batch", action="store_true", help="整季批量入库")
+    parser.add_argument("--fallback", action="store_true", help="识别全部失败，测试非TMDB刮削路径")
+    parser.add_argument("--event-series", type=int, default=2, help="监控事件测试的剧集数")
+    parser.add_argument("--event-timeout", type=float, default=120, help="监控事件测试超时（秒）")
+    parser.add_argument("--json", action="store_true", help="以JSON输出结果")
+    args = parser.parse_args()
+
+    workdir = Path(tempfile.mkdtemp(prefix="shortplaymonitor-bench-"))
+    fake_ffmpeg = make_fake_ffmpeg(workdir / "bin", args.ffmpeg_latency)
+    os.environ["PATH"] = f"{fake_ffmpeg.parent}{os.pathsep}{os.environ.get('PATH', '')}"
+
+    def _find_cover(_self, title: str):
+        time.sleep(args.site_latency / 1000)
+        return None
+
+    tracemalloc.start()
+    try:
+        with mock.patch.object(site_cover, "SiteOper") as site_oper, \
+                mock.patch.object(site_cover.SiteCoverFinder, "find", _find_cover):
+            site_oper.return_value.get_by_domain.return_value = None
+            plugin, chain = build_plugin(workdir, args)
+            try:
+                files = make_tree(workdir / "source", args.series, args.episodes)
+                sync_rate = bench_sync_all(plugin, files)
+                events = bench_events(plugin, workdir / "source", args.event_series, args.episodes,
+                                      timeout=args.event_timeout)
+            finally:
+                plugin.stop_service()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    result = {
+        "files": args.series * args.episodes,
+        "sync_all_files_per_sec": round(sync_rate, 1),
+        "events": events,
+        "chain_calls": chain.calls,
+        "peak_python_mem_mb": round(peak / 1024 / 1024, 1),
+        "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "stages": plugin._metrics.stage_rows() if plugin._metrics else [],
+        "scrape_episode_only": (plugin._metrics.snapshot().get("counters") or {}).get("scrape_episode_only", 0)
+        if plugin._metrics else 0,
+    }
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+        return
+    print(f"文件数：{result['files']}")
+    print(f"全量同步：{result['sync_all_files_per_sec']} 文件/秒")
+    if events:
+        print(f"监控事件：{events['done']}/{events['events']} 完成，"
+              f"P50 {events['p50_s']}s，P95 {events['p95_s']}s，最大 {events['max_s']}s")
+    else:
+        print("监控事件：无完成事件")
+    print(f"chain调用：{chain.calls}")
+    print(f"只生成分集NFO：{result['scrape_episode_only']} 个")
+    print(f"Python内存峰值：{result['peak_python_mem_mb']}MB，进程RSS峰值：{result['max_rss_mb']}MB")
+    for row in result["stages"]:
+        if row.get("count"):
+            print(f"  {row['name']}：{row['count']} 次，平均 {row['avg_ms']}ms，P95 {row['p95_ms']}ms")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,112 @@
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Hashable, Optional, Tuple
+
+from app.log import logger
+
+from .fileio import atomic_writer
+
+
+class MediaCache:
+    """
+    识别结果缓存（LRU + TTL）
+    同时缓存识别成功与识别失败（None）的结果，可选持久化到插件数据目录
+    """
+
+    def __init__(self, maxsize: int = 2048, ttl: int = 86400, negative_ttl: int = 3600,
+                 cache_file: Optional[Path] = None):
+        """
+        :param maxsize: 最大缓存条目数
+        :param ttl: 识别成功结果的有效期（秒）
+        :param negative_ttl: 识别失败结果的有效期（秒）
+        :param cache_file: 持久化文件路径，为空则只缓存在内存中
+        """
+        self._maxsize = maxsize
+        self._ttl = ttl
+        self._negative_ttl = negative_ttl
+        self._cache_file = cache_file
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._dirty = False
+        if self._cache_file:
+            self.load()
+
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        """
+        查询缓存
+        :return: (是否命中, 缓存值)，缓存值为None表示此前识别失败
+        """
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return False, None
+            expire, value = item
+            if expire < time.time():
+                del self._data[key]
+                self._dirty = True
+                return False, None
+            self._data.move_to_end(key)
+            return True, value
+
+    def set(self, key: Hashable, value: Any):
+        """
+        写入缓存，value为None时按识别失败结果缓存
+        """
+        ttl = self._ttl if value is not None else self._negative_ttl
+        with self._lock:
+            self._data[key] = (time.time() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self._maxsize:
+                self._data.popitem(last=False)
+            self._dirty = True
+
+    def clear(self):
+        """
+        清空缓存
+        """
+        with self._lock:
+            self._data.clear()
+            self._dirty = True
+
+    def __len__(self):
+        return len(self._data)
+
+    def load(self):
+        """
+        从持久化文件加载缓存，过期条目直接丢弃
+        """
+        if not self._cache_file or not self._cache_file.exists():
+            return
+        try:
+            with open(self._cache_file, "rb") as f:
+                data = pickle.load(f)
+            now = time.time()
+            with self._lock:
+                for key, (expire, value) in data:
+                    if expire >= now:
+                        self._data[key] = (expire, value)
+                while len(self._data) > self._maxsize:
+                    self._data.popitem(last=False)
+                self._dirty = False
+            logger.info(f"已加载识别缓存 {len(self._data)} 条")
+        except Exception as e:
+            logger.error(f"加载识别缓存失败：{str(e)}")
+
+    def save(self):
+        """
+        持久化缓存到文件，先写临时文件再替换，避免写入中断导致文件损坏
+        """
+        if not self._cache_file or not self._dirty:
+            return
+        try:
+            with self._lock:
+                data = list(self._data.items())
+                self._dirty = False
+            self._cache_file.parent.mkdir(parents=True, exist_ok=True)
+            with atomic_writer(self._cache_file) as f:
+                pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception as e:
+            logger.error(f"保存识别缓存失败：{str(e)}")
@@ -0,0 +1,106 @@
+import threading
+from pathlib import Path
+from typing import Dict, Optional
+from urllib.parse import urlparse
+
+from requests import Session
+from requests.adapters import HTTPAdapter
+
+from app.core.config import settings
+from app.log import logger
+
+from .fileio import atomic_writer
+
+# 允许的图片响应类型，部分图床返回 octet-stream
+_ALLOWED_CONTENT_TYPES = ("image/", "application/octet-stream", "binary/octet-stream")
+
+
+class _DownloadAborted(Exception):
+    """
+    下载内容不符合要求，放弃写入
+    """
+
+
+class ImageDownloader:
+    """
+    图片下载
+    分块流式写入临时文件，完成后原子替换目标文件；限制最大大小并校验响应类型；同一主机复用连接
+    """
+
+    def __init__(self, max_size: int = 20 * 1024 * 1024, chunk_size: int = 64 * 1024, timeout: int = 30):
+        """
+        :param max_size: 图片最大字节数
+        :param chunk_size: 分块大小
+        :param timeout: 请求超时时间（秒）
+        """
+        self._max_size = max_size
+        self._chunk_size = chunk_size
+        self._timeout = timeout
+        self._sessions: Dict[str, Session] = {}
+        self._lock = threading.Lock()
+
+    def __session(self, host: str) -> Session:
+        """
+        获取主机对应的会话
+        """
+        with self._lock:
+            session = self._sessions.get(host)
+            if not session:
+                session = Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=8)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                session.headers.update({"User-Agent": settings.USER_AGENT})
+                self._sessions[host] = session
+            return session
+
+    def download(self, url: str, file_path: Path, proxies: Optional[dict] = None) -> bool:
+        """
+        下载图片到指定路径，网络异常及5xx响应时抛出 RequestException，4xx响应返回False
+        :param url: 图片地址
+        :param file_path: 保存路径
+        :param proxies: 代理，TMDB图片按系统代理设置下载
+        :return: 是否下载成功
+        """
+        session = self.__session(urlparse(url).netloc)
+        with session.get(url, stream=True, timeout=self._timeout, allow_redirects=True, proxies=proxies) as r:
+            if 400 <= r.status_code < 500:
+                # 图片不存在等客户端错误重试无意义，直接返回失败
+                logger.error(f"{url} 下载失败：{r.status_code}")
+                return False
+            # 服务端错误按网络异常抛出，由调用方重试
+            r.raise_for_status()
+            content_type = (r.headers.get("Content-Type") or "").lower()
+            if content_type and not content_type.startswith(_ALLOWED_CONTENT_TYPES):
+                logger.error(f"{url} 不是图片：{content_type}")
+                return False
+            content_length = r.headers.get("Content-Length")
+            if content_length and content_length.isdigit() and int(content_length) > self._max_size:
+                logger.error(f"{url} 图片过大：{content_length} 字节")
+                return False
+            size = 0
+            try:
+                with atomic_writer(file_path) as f:
+                    for chunk in r.iter_content(chunk_size=self._chunk_size):
+                        if not chunk:
+                            continue
+                        size += len(chunk)
+                        if size > self._max_size:
+                            raise _DownloadAborted(f"图片超过 {self._max_size} 字节，停止下载")
+                        f.write(chunk)
+                    if not size:
+                        raise _DownloadAborted("图片内容为空")
+            except _DownloadAborted as e:
+                # 放弃写入，临时文件已删除，不替换原文件
+                logger.error(f"{url} {str(e)}")
+                return False
+            return True
+
+    def close(self):
+        """
+        关闭所有会话
+        """
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions = {}
@@ -0,0 +1,146 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, List, Optional, Tuple
+
+from app.log import logger
+
+
+class _PendingEvent:
+    """
+    待处理的文件事件
+    """
+    __slots__ = ("event", "source_dir", "size", "mtime", "stable_since")
+
+    def __init__(self, event: Any, source_dir: str):
+        self.event = event
+        self.source_dir = source_dir
+        self.size = None
+        self.mtime = None
+        self.stable_since = None
+
+
+class EventQueue:
+    """
+    文件事件合并队列
+    监控线程只负责入队，同一路径的多个事件合并为一个，文件大小和修改时间稳定后再交给处理函数
+    """
+
+    def __init__(self, handler: Callable[..., None], maxsize: int = 10000,
+                 settle_time: float = 3, check_interval: float = 1):
+        """
+        :param handler: 处理函数，参数为 event、source_dir、event_path
+        :param maxsize: 队列最大长度，队列满时入队阻塞
+        :param settle_time: 文件大小和修改时间保持不变多久后视为写入完成（秒）
+        :param check_interval: 检查文件状态的间隔（秒）
+        """
+        self._handler = handler
+        self._maxsize = maxsize
+        self._settle_time = settle_time
+        self._check_interval = check_interval
+        self._pending: "OrderedDict[str, _PendingEvent]" = OrderedDict()
+        self._cond = threading.Condition()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def depth(self) -> int:
+        """
+        当前队列深度
+        """
+        return len(self._pending)
+
+    def start(self):
+        """
+        启动分发线程
+        """
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self.__run, name="ShortPlayMonitor-EventQueue", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> List[Tuple[str, str, Any]]:
+        """
+        停止分发线程
+        :return: 未处理的事件 (事件路径, 监控目录, 事件)，由调用方记录以便重启后恢复
+        """
+        self._stop_event.set()
+        with self._cond:
+            self._cond.notify_all()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout=10)
+        self._thread = None
+        with self._cond:
+            pending = [(event_path, item.source_dir, item.event) for event_path, item in self._pending.items()]
+            self._pending.clear()
+            self._cond.notify_all()
+        return pending
+
+    def put(self, event: Any, source_dir: str, event_path: str):
+        """
+        事件入队，同一路径已在队列中时只更新事件，队列满时阻塞等待
+        """
+        with self._cond:
+            pending = self._pending.get(event_path)
+            if pending:
+                pending.event = event
+                pending.source_dir = source_dir
+                return
+            while len(self._pending) >= self._maxsize and not self._stop_event.is_set():
+                self._cond.wait(timeout=1)
+            if self._stop_event.is_set():
+                return
+            self._pending[event_path] = _PendingEvent(event=event, source_dir=source_dir)
+            self._cond.notify_all()
+
+    def __run(self):
+        """
+        分发线程，定期检查队列中文件是否已稳定
+        """
+        while not self._stop_event.is_set():
+            with self._cond:
+                if not self._pending:
+                    self._cond.wait(timeout=self._check_interval)
+                items = list(self._pending.items())
+
+            now = time.time()
+            for event_path, pending in items:
+                if self._stop_event.is_set():
+                    return
+                state = self.__check(event_path, pending, now)
+                if state == "wait":
+                    continue
+                with self._cond:
+                    self._pending.pop(event_path, None)
+                    self._cond.notify_all()
+                if state == "gone":
+                    logger.debug(f"{event_path} 已不存在，忽略事件")
+                    continue
+                try:
+                    self._handler(event=pending.event, source_dir=pending.source_dir, event_path=event_path)
+                except Exception as e:
+                    logger.error(f"处理文件事件 {event_path} 出错：{str(e)}")
+
+            self._stop_event.wait(self._check_interval)
+
+    def __check(self, event_path: str, pending: _PendingEvent, now: float) -> str:
+        """
+        检查文件是否已写入完成
+        :return: ready 已稳定，wait 仍在写入，gone 文件已不存在
+        """
+        if pending.event.is_directory:
+            return "ready"
+        try:
+            stat = os.stat(event_path)
+        except OSError:
+            return "gone"
+        if stat.st_size != pending.size or stat.st_mtime != pending.mtime:
+            pending.size = stat.st_size
+            pending.mtime = stat.st_mtime
+            pending.stable_since = now
+            return "wait"
+        if now - pending.stable_since >= self._settle_time:
+            return "ready"
+        return "wait"
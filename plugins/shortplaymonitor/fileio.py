@@ -0,0 +1,34 @@
+import os
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import BinaryIO, Iterator, Union
+
+
+@contextmanager
+def atomic_writer(file_path: Union[str, Path]) -> Iterator[BinaryIO]:
+    """
+    先写同目录下的临时文件，正常结束后替换目标文件，出错时删除临时文件，避免读到不完整的文件
+    临时文件名唯一，同一文件并发写入时互不覆盖，最后完成的写入生效
+    :param file_path: 目标文件路径
+    """
+    file_path = Path(file_path)
+    tmp_path = file_path.with_name(f".{file_path.name}.{uuid.uuid4().hex[:8]}.tmp")
+    try:
+        # 独占创建，文件权限按 umask 生成
+        with open(tmp_path, "xb") as f:
+            yield f
+        os.replace(tmp_path, file_path)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+
+def write_atomic(file_path: Union[str, Path], data: bytes):
+    """
+    原子写入文件内容
+    :param file_path: 目标文件路径
+    :param data: 文件内容
+    """
+    with atomic_writer(file_path) as f:
+        f.write(data)
@@ -0,0 +1,22 @@
+import threading
+import zlib
+from typing import Any, List
+
+
+class StripedLock:
+    """
+    分段锁
+    按键哈希到固定数量的锁上，相同键总是得到同一把锁，不同键大概率得到不同的锁
+    """
+
+    def __init__(self, stripes: int = 64):
+        """
+        :param stripes: 锁的数量
+        """
+        self._locks: List[threading.Lock] = [threading.Lock() for _ in range(max(int(stripes), 1))]
+
+    def get(self, key: Any) -> threading.Lock:
+        """
+        获取键对应的锁
+        """
+        return self._locks[zlib.crc32(str(key).encode("utf-8")) % len(self._locks)]
@@ -0,0 +1,166 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+
+# 耗时分布的桶上限（毫秒）
+_BUCKETS_MS = [10, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000]
+
+# 阶段名称
+STAGE_NAMES = {
+    "recognition": "媒体识别",
+    "tmdb_episodes": "TMDB剧集",
+    "transfer": "文件转移",
+    "scrape_metadata": "刮削元数据",
+    "ffmpeg": "FFmpeg截图",
+    "site_fetch": "站点检索",
+    "image_download": "图片下载",
+}
+
+
+class _Histogram:
+    """
+    耗时统计
+    """
+    __slots__ = ("count", "errors", "total", "max", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * (len(_BUCKETS_MS) + 1)
+
+    def observe(self, ms: float, error: bool):
+        self.count += 1
+        self.total += ms
+        self.max = max(self.max, ms)
+        if error:
+            self.errors += 1
+        for index, bound in enumerate(_BUCKETS_MS):
+            if ms <= bound:
+                self.buckets[index] += 1
+                return
+        self.buckets[-1] += 1
+
+    def percentile(self, p: float) -> float:
+        """
+        按桶估算分位数，返回桶上限
+        """
+        if not self.count:
+            return 0
+        target = self.count * p
+        seen = 0
+        for index, num in enumerate(self.buckets):
+            seen += num
+            if seen >= target:
+                return _BUCKETS_MS[index] if index < len(_BUCKETS_MS) else self.max
+        return self.max
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "avg_ms": round(self.total / self.count, 1) if self.count else 0,
+            "p50_ms": self.percentile(0.5),
+            "p95_ms": self.percentile(0.95),
+            "max_ms": round(self.max, 1),
+        }
+
+
+class _Timer:
+    """
+    计时句柄，可手动标记失败
+    """
+    __slots__ = ("failed",)
+
+    def __init__(self):
+        self.failed = False
+
+    def fail(self):
+        self.failed = True
+
+
+class Metrics:
+    """
+    各处理阶段的调用次数、错误数和耗时分布，以及计数器和队列深度
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages: Dict[str, _Histogram] = {}
+        self._counters: Dict[str, int] = {}
+        self._gauges: Dict[str, Callable[[], int]] = {}
+        self._start_time = time.time()
+
+    @contextmanager
+    def timer(self, stage: str):
+        """
+        统计代码块耗时，抛出异常或调用 fail() 时计为错误
+        """
+        handle = _Timer()
+        start = time.perf_counter()
+        try:
+            yield handle
+        except Exception:
+            handle.fail()
+            raise
+        finally:
+            self.observe(stage, time.perf_counter() - start, handle.failed)
+
+    def observe(self, stage: str, seconds: float, error: bool = False):
+        """
+        记录一次阶段耗时
+        """
+        with self._lock:
+            histogram = self._stages.get(stage)
+            if not histogram:
+                histogram = self._stages[stage] = _Histogram()
+            histogram.observe(seconds * 1000, error)
+
+    def incr(self, name: str, num: int = 1):
+        """
+        计数器加一
+        """
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + num
+
+    def gauge(self, name: str, func: Optional[Callable[[], int]]):
+        """
+        注册实时取值的指标（如队列深度），func为None时移除
+        """
+        with self._lock:
+            if func:
+                self._gauges[name] = func
+            else:
+                self._gauges.pop(name, None)
+
+    def snapshot(self) -> dict:
+        """
+        当前统计数据
+        """
+        with self._lock:
+            stages = {name: histogram.to_dict() for name, histogram in self._stages.items()}
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+        values = {}
+        for name, func in gauges.items():
+            try:
+                values[name] = func()
+            except Exception:
+                values[name] = None
+        return {
+            "uptime": int(time.time() - self._start_time),
+            "stages": stages,
+            "counters": counters,
+            "gauges": values,
+        }
+
+    def stage_rows(self) -> List[dict]:
+        """
+        按固定顺序返回各阶段统计，用于页面展示
+        """
+        stages = self.snapshot().get("stages")
+        names = list(STAGE_NAMES.keys()) + [name for name in stages if name not in STAGE_NAMES]
+        return [{"stage": name, "name": STAGE_NAMES.get(name, name), **stages.get(name, _Histogram().to_dict())}
+                for name in names]
@@ -0,0 +1,159 @@
+import os
+import re
+import time
+import xml.etree.ElementTree as ET
+from pathlib import Path
+from typing import Any, Iterable, Optional, Tuple
+
+from app.log import logger
+
+from .fileio import write_atomic
+
+# 文件名中的季集
+_SEASON_EPISODE = re.compile(r"S(\d+)E(\d+)", re.IGNORECASE)
+
+
+def parse_season_episode(name: str) -> Tuple[Optional[int], Optional[int]]:
+    """
+    从文件名解析季集，如 S01E02
+    """
+    match = _SEASON_EPISODE.search(name)
+    if not match:
+        return None, None
+    return int(match.group(1)), int(match.group(2))
+
+
+def _to_bytes(root: ET.Element) -> bytes:
+    """
+    生成带声明的XML
+    """
+    ET.indent(root, space="  ")
+    return ET.tostring(root, encoding="utf-8", xml_declaration=True)
+
+
+def _get(obj: Any, name: str):
+    """
+    读取TMDB数据的字段，兼容对象和字典
+    """
+    if isinstance(obj, dict):
+        return obj.get(name)
+    return getattr(obj, name, None)
+
+
+def _sub(parent: ET.Element, tag: str, text) -> ET.Element:
+    """
+    添加子节点
+    """
+    node = ET.SubElement(parent, tag)
+    if text is not None:
+        node.text = str(text)
+    return node
+
+
+class NfoWriter:
+    """
+    短剧NFO生成，用于未从TMDB刮削时生成 tvshow.nfo 及分集NFO
+    """
+
+    def __init__(self, media_exts: Iterable[str]):
+        """
+        :param media_exts: 媒体文件后缀，批量生成分集NFO时使用
+        """
+        self._media_exts = frozenset(ext.lower() for ext in media_exts)
+
+    @staticmethod
+    def write_tvshow(dir_path: Path, title: str) -> Path:
+        """
+        生成电视剧NFO
+        :param dir_path: 电视剧根目录
+        :param title: 标题
+        """
+        root = ET.Element("tvshow")
+        _sub(root, "title", title)
+        _sub(root, "originaltitle", title)
+        _sub(root, "season", "-1")
+        _sub(root, "episode", "-1")
+        file_path = dir_path / "tvshow.nfo"
+        write_atomic(file_path, _to_bytes(root))
+        logger.info(f"NFO文件已保存：{file_path}")
+        return file_path
+
+    @staticmethod
+    def write_episode(video_path: Path, title: str, overwrite: bool = False,
+                      episode_info: Any = None) -> Optional[Path]:
+        """
+        生成分集NFO，文件名中没有季集信息时不生成
+        :param video_path: 视频文件路径
+        :param title: 剧集标题
+        :param overwrite: 已存在时是否覆盖
+        :param episode_info: TMDB分集信息，有则按MoviePilot刮削的分集NFO写入简介、播出日期、评分、导演和演员，
+                             带分集编号时同时写入TMDB编号
+        """
+        file_path = video_path.with_suffix(".nfo")
+        if not overwrite and file_path.exists():
+            return None
+        season, episode = parse_season_episode(video_path.name)
+        if episode_info:
+            season = getattr(episode_info, "season_number", None) or season
+            episode = getattr(episode_info, "episode_number", None) or episode
+        if episode is None:
+            return None
+        root = ET.Element("episodedetails")
+        episode_id = _get(episode_info, "id")
+        if episode_id:
+            uniqueid = _sub(root, "uniqueid", episode_id)
+            uniqueid.set("type", "tmdb")
+            uniqueid.set("default", "true")
+            _sub(root, "tmdbid", episode_id)
+        _sub(root, "title", _get(episode_info, "name") or f"第{episode}集")
+        _sub(root, "showtitle", title)
+        if episode_info:
+            overview = _get(episode_info, "overview") or ""
+            air_date = _get(episode_info, "air_date") or ""
+            _sub(root, "plot", overview)
+            _sub(root, "outline", overview)
+            _sub(root, "aired", air_date)
+            _sub(root, "year", air_date[:4])
+        _sub(root, "season", season)
+        _sub(root, "episode", episode)
+        if episode_info:
+            _sub(root, "rating", _get(episode_info, "vote_average") or "0")
+            for crew in _get(episode_info, "crew") or []:
+                if _get(crew, "known_for_department") == "Directing":
+                    _sub(root, "director", _get(crew, "name") or "").set("tmdbid", str(_get(crew, "id") or ""))
+            for star in _get(episode_info, "guest_stars") or []:
+                if _get(star, "known_for_department") == "Acting":
+                    actor = _sub(root, "actor", None)
+                    _sub(actor, "name", _get(star, "name") or "")
+                    _sub(actor, "type", "Actor")
+                    _sub(actor, "tmdbid", _get(star, "id") or "")
+            _sub(root, "dateadded", time.strftime("%Y-%m-%d %H:%M:%S", time.localtime()))
+        write_atomic(file_path, _to_bytes(root))
+        return file_path
+
+    def write_episodes(self, dir_path: Path, title: str) -> int:
+        """
+        为目录下所有还没有NFO的视频批量生成分集NFO
+        :param dir_path: 剧集目录
+        :param title: 剧集标题
+        :return: 生成数量
+        """
+        try:
+            with os.scandir(dir_path) as it:
+                names = {entry.name for entry in it if entry.is_file()}
+        except OSError as e:
+            logger.error(f"读取目录 {dir_path} 失败：{str(e)}")
+            return 0
+        count = 0
+        for name in names:
+            stem, ext = os.path.splitext(name)
+            if ext.lower() not in self._media_exts or f"{stem}.nfo" in names:
+                continue
+            try:
+                if self.write_episode(video_path=dir_path / name, title=title, overwrite=True):
+                    count += 1
+            except OSError as e:
+                logger.error(f"生成 {dir_path / name} 分集NFO失败：{str(e)}")
+        if count:
+            logger.info(f"{dir_path} 已批量生成分集NFO {count} 个")
+        return count
@@ -0,0 +1,93 @@
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Iterable, List, Optional, Tuple
+
+from app.log import logger
+
+# 回收站及隐藏文件
+_SYSTEM_PATTERN = re.compile(r"/(?:@Recycle|#recycle|\.|@eaDir)")
+
+
+class PathFilter:
+    """
+    路径过滤
+    过滤关键字在加载配置时预编译合并为一个正则，一次匹配即可判断并得到命中的关键字，判断结果缓存
+    """
+
+    def __init__(self, exclude_keywords: str, extensions: Iterable[str], cache_size: int = 4096):
+        """
+        :param exclude_keywords: 过滤关键字，每行一个正则
+        :param extensions: 媒体文件后缀
+        :param cache_size: 判断结果缓存条目数
+        """
+        self._extensions = frozenset(ext.lower() for ext in extensions)
+        self._keywords: List[str] = []
+        self._combined: Optional[re.Pattern] = None
+        # 自带分组的关键字合并后分组编号会变化，单独匹配
+        self._standalone: List[Tuple[str, re.Pattern]] = []
+        self._cache: "OrderedDict[str, Optional[str]]" = OrderedDict()
+        self._cache_size = cache_size
+        self._lock = threading.Lock()
+        self.__compile(exclude_keywords)
+
+    def __compile(self, exclude_keywords: str):
+        """
+        编译过滤关键字
+        """
+        parts = []
+        for keyword in (exclude_keywords or "").split("\n"):
+            if not keyword:
+                continue
+            try:
+                pattern = re.compile(keyword)
+            except re.error as e:
+                logger.warn(f"过滤关键字 {keyword} 不是有效的正则表达式，按普通文本匹配：{str(e)}")
+                pattern = re.compile(re.escape(keyword))
+            if pattern.groups or "(?" in keyword:
+                self._standalone.append((keyword, pattern))
+                continue
+            parts.append(f"(?P<k{len(self._keywords)}>{pattern.pattern})")
+            self._keywords.append(keyword)
+        if parts:
+            self._combined = re.compile("|".join(parts))
+
+    def exclude_reason(self, path: str) -> Optional[str]:
+        """
+        判断路径是否需要排除
+        :param path: 文件或目录路径
+        :return: 排除原因（包含命中的规则），不排除时返回None
+        """
+        with self._lock:
+            if path in self._cache:
+                self._cache.move_to_end(path)
+                return self._cache[path]
+        reason = self.__match(path)
+        with self._lock:
+            self._cache[path] = reason
+            if len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+        return reason
+
+    def __match(self, path: str) -> Optional[str]:
+        """
+        匹配过滤规则
+        """
+        match = _SYSTEM_PATTERN.search(path)
+        if match:
+            return f"是回收站或隐藏的文件（{match.group()}）"
+        if self._combined:
+            match = self._combined.search(path)
+            if match:
+                return f"命中过滤关键字 {self._keywords[int(match.lastgroup[1:])]}"
+        for keyword, pattern in self._standalone:
+            if pattern.search(path):
+                return f"命中过滤关键字 {keyword}"
+        return None
+
+    def is_media(self, path: str) -> bool:
+        """
+        是否媒体文件
+        """
+        return os.path.splitext(path)[1].lower() in self._extensions
@@ -0,0 +1,93 @@
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from app.log import logger
+
+from .worker_pool import ShardedWorkerPool
+
+
+class FileJob:
+    """
+    流水线中传递的单个文件任务，各阶段依次补充结果
+    """
+    __slots__ = ("is_directory", "event_path", "source_dir", "series_key", "file_key", "scrape",
+                 "file_meta", "mediainfo", "episodes_info", "title", "target", "outcome")
+
+    def __init__(self, is_directory: bool, event_path: str, source_dir: str, series_key: str,
+                 file_key: Optional[str] = None, scrape: bool = True):
+        self.is_directory = is_directory
+        self.event_path = event_path
+        self.source_dir = source_dir
+        self.series_key = series_key
+        self.file_key = file_key
+        # 转移后是否生成图片和NFO，批量处理时由调用方按目录生成
+        self.scrape = scrape
+        # 识别阶段：元数据、TMDB媒体信息和分集信息
+        self.file_meta = None
+        self.mediainfo = None
+        self.episodes_info = None
+        # 未识别到TMDB时按重命名规则计算的标题
+        self.title: Optional[str] = None
+        # 转移后的目标文件
+        self.target: Optional[Path] = None
+        # 转移阶段：处理结果 transferred、linked、exists、failed
+        self.outcome: Optional[str] = None
+
+
+class StagedPipeline:
+    """
+    分阶段处理流水线
+    每个阶段一个按键分片的线程池和队列，任务完成当前阶段后提交到下一阶段；
+    后面的阶段较慢时不占用前面阶段的线程，队列满时提交阻塞，形成反压
+    """
+
+    def __init__(self, stages: Sequence[Tuple[str, int, int]], name: str = "ShortPlayMonitor"):
+        """
+        :param stages: 按处理顺序排列的 (阶段名, 线程数, 每个线程的队列长度上限)
+        :param name: 线程名称前缀
+        """
+        self._stages: List[str] = [stage for stage, _, _ in stages]
+        self._pools: Dict[str, ShardedWorkerPool] = {
+            stage: ShardedWorkerPool(workers=workers, queue_size=queue_size, name=f"{name}-{stage}")
+            for stage, workers, queue_size in stages
+        }
+
+    def depth(self, stage: str) -> int:
+        """
+        阶段排队中的任务数
+        """
+        pool = self._pools.get(stage)
+        return pool.depth if pool else 0
+
+    def submit(self, stage: str, key: Any, func: Callable, *args, **kwargs) -> bool:
+        """
+        提交任务到指定阶段
+        :param stage: 阶段名
+        :param key: 分片键，同一阶段内相同键的任务按提交顺序执行
+        :return: 是否提交成功，流水线已停止时返回False
+        """
+        return self._pools[stage].submit(key, func, *args, **kwargs)
+
+    def join(self):
+        """
+        等待所有任务完成
+        任务只会提交到后面的阶段，按阶段顺序依次等待即可
+        """
+        for stage in self._stages:
+            self._pools[stage].join()
+
+    def stop(self) -> List[Tuple[str, Callable, tuple, dict]]:
+        """
+        停止所有阶段，排队中的任务不再执行
+        先标记全部阶段停止，前面阶段阻塞在向后面阶段提交的线程立即返回；再从后往前等待各阶段线程退出
+        :return: 未执行的任务 (阶段名, func, args, kwargs)
+        """
+        for pool in self._pools.values():
+            pool.cancel()
+        dropped = []
+        for stage in reversed(self._stages):
+            try:
+                dropped.extend((stage,) + task for task in self._pools[stage].stop())
+            except Exception as e:
+                logger.error(f"停止{stage}线程池失败：{str(e)}")
+        return dropped
@@ -0,0 +1,241 @@
+import os
+import pickle
+import threading
+import time
+from functools import partial
+from pathlib import Path
+from typing import Callable, Dict, FrozenSet, Optional, Tuple
+
+from watchdog.events import DirCreatedEvent, DirDeletedEvent, FileCreatedEvent, FileDeletedEvent
+from watchdog.observers.api import BaseObserver, EventEmitter
+
+from app.log import logger
+
+from .fileio import atomic_writer
+
+# 目录状态：(目录修改时间ns, 修改时间是否已稳定, 文件名, 子目录名)
+DirState = Tuple[int, bool, FrozenSet[str], FrozenSet[str]]
+
+# 目录修改时间精度（ns），列出目录时修改时间距今不足该值的，下次轮询仍重新列出，避免同一时间单位内的新增文件被漏掉
+_MTIME_GRANULARITY = 2 * 10 ** 9
+
+
+class SnapshotStore:
+    """
+    轮询快照持久化，按监控目录保存各目录状态，重启后与上次快照比较即可发现停止期间新增的文件
+    """
+
+    def __init__(self, snapshot_file: Optional[Path] = None, save_interval: int = 60):
+        """
+        :param snapshot_file: 快照文件，为空时不持久化
+        :param save_interval: 有变化时最短保存间隔（秒）
+        """
+        self._snapshot_file = snapshot_file
+        self._save_interval = save_interval
+        self._data: Dict[str, Dict[str, DirState]] = {}
+        self._dirty = False
+        self._last_save = 0.0
+        self._lock = threading.Lock()
+        self.load()
+
+    def get(self, root: str) -> Optional[Dict[str, DirState]]:
+        """
+        获取监控目录的快照
+        """
+        with self._lock:
+            snapshot = self._data.get(root)
+            return dict(snapshot) if snapshot is not None else None
+
+    def put(self, root: str, snapshot: Dict[str, DirState]):
+        """
+        更新监控目录的快照，距上次保存超过间隔时保存到文件
+        """
+        with self._lock:
+            self._data[root] = snapshot
+            self._dirty = True
+            due = time.monotonic() - self._last_save >= self._save_interval
+        if due:
+            self.save()
+
+    def load(self):
+        """
+        从文件加载快照
+        """
+        if not self._snapshot_file or not self._snapshot_file.exists():
+            return
+        try:
+            with open(self._snapshot_file, "rb") as f:
+                data = pickle.load(f)
+            with self._lock:
+                self._data = data
+                self._dirty = False
+            logger.info(f"已加载目录轮询快照 {sum(len(snapshot) for snapshot in data.values())} 个目录")
+        except Exception as e:
+            logger.error(f"加载目录轮询快照失败：{str(e)}")
+
+    def save(self):
+        """
+        保存快照，先写临时文件再替换
+        """
+        if not self._snapshot_file or not self._dirty:
+            return
+        try:
+            with self._lock:
+                data = dict(self._data)
+                self._dirty = False
+                self._last_save = time.monotonic()
+            self._snapshot_file.parent.mkdir(parents=True, exist_ok=True)
+            with atomic_writer(self._snapshot_file) as f:
+                pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception as e:
+            logger.error(f"保存目录轮询快照失败：{str(e)}")
+
+
+class _IncrementalPollingEmitter(EventEmitter):
+    """
+    增量轮询发送器
+    每次轮询只对各目录做一次stat，目录修改时间未变化时不再列出目录和stat其中的文件；
+    有变化时轮询间隔缩短为最短间隔，空闲时逐步加倍到最长间隔
+    """
+
+    def __init__(self, event_queue, watch, timeout=1, store: SnapshotStore = None,
+                 exclude: Optional[Callable[[str], Optional[str]]] = None,
+                 min_interval: float = 10, max_interval: float = 300, **kwargs):
+        super().__init__(event_queue, watch, timeout, **kwargs)
+        self._store = store
+        self._exclude = exclude
+        self._min_interval = min_interval
+        self._max_interval = max(max_interval, min_interval)
+        self._interval = 0
+        self._snapshot: Optional[Dict[str, DirState]] = None
+
+    def on_thread_start(self):
+        self._snapshot = self._store.get(self.watch.path) if self._store else None
+
+    def queue_events(self, timeout):
+        # 第一次立即轮询，之后按当前间隔等待
+        if self._interval and self.stopped_event.wait(self._interval):
+            return
+        start = time.monotonic()
+        baseline = self._snapshot is None
+        try:
+            changes = self.__poll()
+        except Exception as e:
+            logger.error(f"轮询目录 {self.watch.path} 失败：{str(e)}")
+            changes = 0
+        if (changes or baseline) and self._store:
+            self._store.put(self.watch.path, dict(self._snapshot))
+        if changes:
+            self._interval = self._min_interval
+        else:
+            self._interval = min(max(self._interval * 2, self._min_interval), self._max_interval)
+        logger.debug(f"轮询目录 {self.watch.path} 完成，变化 {changes} 个，耗时 {time.monotonic() - start:.2f}s，"
+                     f"{self._interval}s 后再次轮询")
+
+    def __poll(self) -> int:
+        """
+        轮询一次目录
+        :return: 变化数量
+        """
+        # 没有快照时先建立基线，不发送事件
+        baseline = self._snapshot is None
+        if baseline:
+            self._snapshot = {}
+        snapshot = self._snapshot
+        changes = 0
+        stack = [self.watch.path]
+        while stack:
+            if self.stopped_event.is_set():
+                break
+            path = stack.pop()
+            state = snapshot.get(path)
+            try:
+                mtime = os.stat(path).st_mtime_ns
+            except OSError:
+                if state:
+                    changes += self.__remove(path, emit=True)
+                continue
+            if state and state[0] == mtime and state[1]:
+                # 目录内容未变化，只继续检查子目录
+                stack.extend(os.path.join(path, name) for name in state[3])
+                continue
+            listed = self.__list(path)
+            if listed is None:
+                continue
+            files, dirs = listed
+            stable = time.time_ns() - mtime >= _MTIME_GRANULARITY
+            snapshot[path] = (mtime, stable, files, dirs)
+            if not baseline:
+                changes += self.__diff(path, state, files, dirs)
+            stack.extend(os.path.join(path, name) for name in dirs)
+        return changes
+
+    def __diff(self, path: str, state: Optional[DirState], files: FrozenSet[str], dirs: FrozenSet[str]) -> int:
+        """
+        比较目录前后状态并发送事件，新目录中的文件全部视为新增
+        """
+        old_files, old_dirs = (state[2], state[3]) if state else (frozenset(), frozenset())
+        changes = 0
+        for name in files - old_files:
+            self.queue_event(FileCreatedEvent(os.path.join(path, name)))
+            changes += 1
+        for name in old_files - files:
+            self.queue_event(FileDeletedEvent(os.path.join(path, name)))
+            changes += 1
+        for name in dirs - old_dirs:
+            self.queue_event(DirCreatedEvent(os.path.join(path, name)))
+            changes += 1
+        for name in old_dirs - dirs:
+            changes += self.__remove(os.path.join(path, name), emit=True)
+        return changes
+
+    def __list(self, path: str) -> Optional[Tuple[FrozenSet[str], FrozenSet[str]]]:
+        """
+        列出目录下的文件和子目录，排除的子目录不记录
+        """
+        files, dirs = [], []
+        try:
+            with os.scandir(path) as it:
+                for entry in it:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            if self._exclude and self._exclude(entry.path + os.sep):
+                                continue
+                            dirs.append(entry.name)
+                        else:
+                            files.append(entry.name)
+                    except OSError:
+                        continue
+        except OSError as e:
+            logger.debug(f"读取目录 {path} 失败：{str(e)}")
+            return None
+        return frozenset(files), frozenset(dirs)
+
+    def __remove(self, path: str, emit: bool) -> int:
+        """
+        从快照中移除目录及其子目录
+        """
+        state = self._snapshot.pop(path, None)
+        if not state:
+            return 0
+        if emit:
+            self.queue_event(DirDeletedEvent(path))
+        return 1 + sum(self.__remove(os.path.join(path, name), emit=False) for name in state[3])
+
+
+class IncrementalPollingObserver(BaseObserver):
+    """
+    增量轮询观察者，用于兼容模式监控远程共享目录
+    """
+
+    def __init__(self, store: SnapshotStore = None, exclude: Optional[Callable[[str], Optional[str]]] = None,
+                 min_interval: float = 10, max_interval: float = 300, timeout: float = 1):
+        """
+        :param store: 快照持久化
+        :param exclude: 排除判断函数，命中的目录不轮询
+        :param min_interval: 有变化时的轮询间隔（秒）
+        :param max_interval: 空闲时的最长轮询间隔（秒）
+        """
+        super().__init__(emitter_class=partial(_IncrementalPollingEmitter, store=store, exclude=exclude,
+                                               min_interval=min_interval, max_interval=max_interval),
+                         timeout=timeout)
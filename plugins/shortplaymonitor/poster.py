@@ -0,0 +1,151 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Iterable, Optional, Tuple, Union
+
+from PIL import Image
+
+from app.log import logger
+
+from .fileio import atomic_writer
+
+# 比例误差小于该值时视为已符合，不再裁剪
+RATIO_TOLERANCE = 0.01
+# 解码时的最大尺寸，JPEG按此尺寸缩小解码
+MAX_POSTER_SIZE = (1500, 2250)
+
+
+def parse_ratio(cover_conf: Optional[str]) -> float:
+    """
+    解析封面比例配置，如 2:3，未配置时默认 2:3
+    """
+    if not cover_conf:
+        return 2 / 3
+    covers = str(cover_conf).split(":")
+    return int(covers[0]) / int(covers[1])
+
+
+def ratio_matches(size: Tuple[int, int], target_ratio: float, tolerance: float = RATIO_TOLERANCE) -> bool:
+    """
+    图片比例是否在误差范围内符合目标比例
+    """
+    width, height = size
+    if not height:
+        return False
+    return abs(width / height - target_ratio) / target_ratio <= tolerance
+
+
+def crop_image(image: Image.Image, target_ratio: float) -> Image.Image:
+    """
+    按目标比例居中裁剪图片
+    """
+    # 获取原始图片的长宽比
+    original_ratio = image.width / image.height
+
+    # 计算截取后的大小
+    if original_ratio > target_ratio:
+        new_height = image.height
+        new_width = int(new_height * target_ratio)
+    else:
+        new_width = image.width
+        new_height = int(new_width / target_ratio)
+
+    # 计算截取的位置
+    left = (image.width - new_width) // 2
+    top = (image.height - new_height) // 2
+    return image.crop((left, top, left + new_width, top + new_height))
+
+
+def crop_poster(input_path: Union[str, Path], poster_path: Union[str, Path], cover_conf: Optional[str]) -> bool:
+    """
+    截取图片做封面，JPEG按封面最大尺寸缩小解码，先写临时文件再替换
+    :param input_path: 原图路径
+    :param poster_path: 封面保存路径
+    :param cover_conf: 封面比例，如 2:3
+    """
+    with Image.open(input_path) as image:
+        image.draft("RGB", MAX_POSTER_SIZE)
+        return save_poster(image=image, poster_path=poster_path, cover_conf=cover_conf)
+
+
+def save_poster(image: Image.Image, poster_path: Union[str, Path], cover_conf: Optional[str]) -> bool:
+    """
+    在内存中按比例裁剪图片并保存为封面，先写临时文件再替换
+    :param image: 图片
+    :param poster_path: 封面保存路径
+    :param cover_conf: 封面比例，如 2:3
+    """
+    cropped_image = crop_image(image, parse_ratio(cover_conf))
+    if cropped_image.mode not in ("RGB", "L"):
+        cropped_image = cropped_image.convert("RGB")
+    with atomic_writer(poster_path) as f:
+        cropped_image.save(f, format="JPEG", quality=95)
+    return True
+
+
+def _crop_if_needed(poster_path: str, cover_conf: Optional[str]) -> Tuple[str, str, Optional[str]]:
+    """
+    进程池任务：只读取图片头判断比例，不符合时裁剪
+    :return: (封面路径, 结果 cropped/skipped/failed, 错误信息)
+    """
+    try:
+        with Image.open(poster_path) as image:
+            size = image.size
+        if ratio_matches(size, parse_ratio(cover_conf)):
+            return poster_path, "skipped", None
+        crop_poster(input_path=poster_path, poster_path=poster_path, cover_conf=cover_conf)
+        return poster_path, "cropped", None
+    except Exception as e:
+        return poster_path, "failed", str(e)
+
+
+class PosterCropper:
+    """
+    批量裁剪封面
+    已处理过且未变化的封面直接跳过，其余封面在进程池中判断并裁剪
+    """
+
+    def __init__(self, processed_index=None, workers: Optional[int] = None):
+        """
+        :param processed_index: 已处理文件索引，用于记录已处理的封面
+        :param workers: 进程数，默认CPU核数
+        """
+        self._processed_index = processed_index
+        self._workers = workers or os.cpu_count() or 1
+
+    def crop_all(self, poster_paths: Iterable[str], cover_conf: Optional[str]) -> Tuple[int, int]:
+        """
+        批量裁剪封面
+        :param poster_paths: 封面路径
+        :param cover_conf: 封面比例
+        :return: (裁剪数量, 跳过数量)
+        """
+        cropped, skipped = 0, 0
+        todo = []
+        for poster_path in poster_paths:
+            if self._processed_index and self._processed_index.is_poster_done(poster_path, cover_conf):
+                skipped += 1
+                continue
+            todo.append(poster_path)
+        if not todo:
+            return cropped, skipped
+
+        try:
+            with ProcessPoolExecutor(max_workers=min(self._workers, len(todo))) as executor:
+                results = list(executor.map(_crop_if_needed, todo, [cover_conf] * len(todo), chunksize=16))
+        except Exception as e:
+            logger.warn(f"进程池裁剪封面失败，改为逐个处理：{str(e)}")
+            results = [_crop_if_needed(poster_path, cover_conf) for poster_path in todo]
+
+        for poster_path, result, err in results:
+            if result == "failed":
+                logger.error(f"裁剪封面 {poster_path} 失败：{err}")
+                continue
+            if result == "cropped":
+                cropped += 1
+                logger.info(f"封面 {poster_path} 已裁剪 比例为 {cover_conf}")
+            else:
+                skipped += 1
+            if self._processed_index:
+                self._processed_index.record_poster(poster_path, cover_conf)
+        return cropped, skipped
@@ -0,0 +1,224 @@
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from app.log import logger
+
+
+class ProcessedIndex:
+    """
+    已处理文件索引
+    以源文件的（设备号, inode, 大小, 修改时间）为键，记录处理结果和目标路径，
+    全量同步时在识别前跳过已处理的文件
+    """
+
+    # 视为已处理完成、无需再次处理的结果
+    DONE_OUTCOMES = ("transferred", "linked", "exists")
+
+    def __init__(self, db_file: Path):
+        """
+        :param db_file: 索引数据库文件路径
+        """
+        db_file.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(db_file), check_same_thread=False)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS processed ("
+                               "dev INTEGER NOT NULL, "
+                               "ino INTEGER NOT NULL, "
+                               "size INTEGER NOT NULL, "
+                               "mtime INTEGER NOT NULL, "
+                               "path TEXT, "
+                               "outcome TEXT, "
+                               "target TEXT, "
+                               "updated REAL, "
+                               "PRIMARY KEY (dev, ino, size, mtime))")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS posters ("
+                               "path TEXT PRIMARY KEY, "
+                               "size INTEGER NOT NULL, "
+                               "mtime INTEGER NOT NULL, "
+                               "cover_conf TEXT, "
+                               "updated REAL)")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS scraped_dirs ("
+                               "path TEXT PRIMARY KEY, "
+                               "updated REAL)")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS pending_files ("
+                               "path TEXT PRIMARY KEY, "
+                               "source_dir TEXT, "
+                               "updated REAL)")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS pending_artwork ("
+                               "path TEXT PRIMARY KEY, "
+                               "source_dir TEXT, "
+                               "outcome TEXT, "
+                               "target TEXT, "
+                               "updated REAL)")
+            self._conn.commit()
+
+    @staticmethod
+    def file_key(file_path: str, stat: os.stat_result = None) -> Optional[Tuple[int, int, int, int]]:
+        """
+        计算文件键，文件不存在时返回None
+        """
+        try:
+            stat = stat or os.stat(file_path)
+        except OSError:
+            return None
+        return stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+    def get(self, file_path: str, stat: os.stat_result = None) -> Optional[Tuple[str, str]]:
+        """
+        查询文件处理记录
+        :return: (处理结果, 目标路径)，无记录时返回None
+        """
+        key = self.file_key(file_path, stat)
+        if not key:
+            return None
+        with self._lock:
+            row = self._conn.execute("SELECT outcome, target FROM processed "
+                                     "WHERE dev=? AND ino=? AND size=? AND mtime=?", key).fetchone()
+        return tuple(row) if row else None
+
+    def is_processed(self, file_path: str, stat: os.stat_result = None) -> bool:
+        """
+        文件是否已处理完成
+        """
+        record = self.get(file_path, stat)
+        return bool(record) and record[0] in self.DONE_OUTCOMES
+
+    def record(self, file_path: str, outcome: str, target: Optional[str] = None,
+               key: Optional[Tuple[int, int, int, int]] = None, artwork_source_dir: Optional[str] = None):
+        """
+        记录文件处理结果
+        :param key: 处理前计算的文件键，移动方式转移后源文件已不存在，需在处理前计算
+        :param artwork_source_dir: 图片和NFO待生成时传入监控目录，与处理结果一起记录为待生成
+        """
+        key = key or self.file_key(file_path)
+        if not key:
+            return
+        try:
+            with self._lock:
+                now = time.time()
+                if artwork_source_dir:
+                    self._conn.execute("INSERT OR REPLACE INTO pending_artwork "
+                                       "(path, source_dir, outcome, target, updated) VALUES (?, ?, ?, ?, ?)",
+                                       (file_path, artwork_source_dir, outcome, target, now))
+                self._conn.execute("INSERT OR REPLACE INTO processed "
+                                   "(dev, ino, size, mtime, path, outcome, target, updated) "
+                                   "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                                   key + (file_path, outcome, target, now))
+                self._conn.commit()
+        except sqlite3.Error as e:
+            logger.error(f"记录文件处理结果失败：{str(e)}")
+
+    def is_poster_done(self, poster_path: str, cover_conf: Optional[str]) -> bool:
+        """
+        封面是否已按当前比例处理过且之后未变化
+        """
+        key = self.file_key(poster_path)
+        if not key:
+            return False
+        with self._lock:
+            row = self._conn.execute("SELECT size, mtime, cover_conf FROM posters WHERE path=?",
+                                     (poster_path,)).fetchone()
+        return bool(row) and tuple(row) == (key[2], key[3], cover_conf or "")
+
+    def record_poster(self, poster_path: str, cover_conf: Optional[str]):
+        """
+        记录已处理的封面
+        """
+        key = self.file_key(poster_path)
+        if not key:
+            return
+        try:
+            with self._lock:
+                self._conn.execute("INSERT OR REPLACE INTO posters (path, size, mtime, cover_conf, updated) "
+                                   "VALUES (?, ?, ?, ?, ?)",
+                                   (poster_path, key[2], key[3], cover_conf or "", time.time()))
+                self._conn.commit()
+        except sqlite3.Error as e:
+            logger.error(f"记录封面处理结果失败：{str(e)}")
+
+    def is_dir_scraped(self, dir_path: str) -> bool:
+        """
+        目录的剧集级图片和NFO是否已刮削完整
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT 1 FROM scraped_dirs WHERE path=?", (dir_path,)).fetchone()
+        return bool(row)
+
+    def record_dir_scraped(self, dir_path: str):
+        """
+        记录剧集级图片和NFO已刮削完整的目录
+        """
+        try:
+            with self._lock:
+                self._conn.execute("INSERT OR REPLACE INTO scraped_dirs (path, updated) VALUES (?, ?)",
+                                   (dir_path, time.time()))
+                self._conn.commit()
+        except sqlite3.Error as e:
+            logger.error(f"记录目录刮削结果失败：{str(e)}")
+
+    def record_pending_files(self, files: List[Tuple[str, str]]):
+        """
+        记录停止插件时尚未处理的文件，下次启动时重新提交
+        :param files: [(源文件, 监控目录)]
+        """
+        if not files:
+            return
+        try:
+            with self._lock:
+                now = time.time()
+                self._conn.executemany("INSERT OR REPLACE INTO pending_files (path, source_dir, updated) "
+                                       "VALUES (?, ?, ?)",
+                                       [(file_path, source_dir, now) for file_path, source_dir in files])
+                self._conn.commit()
+        except sqlite3.Error as e:
+            logger.error(f"记录未处理文件失败：{str(e)}")
+
+    def pop_pending_files(self) -> List[Tuple[str, str]]:
+        """
+        取出并移除全部未处理文件记录
+        :return: [(源文件, 监控目录)]
+        """
+        try:
+            with self._lock:
+                rows = self._conn.execute("SELECT path, source_dir FROM pending_files ORDER BY updated").fetchall()
+                self._conn.execute("DELETE FROM pending_files")
+                self._conn.commit()
+        except sqlite3.Error as e:
+            logger.error(f"读取未处理文件失败：{str(e)}")
+            return []
+        return [tuple(row) for row in rows]
+
+    def pending_artwork(self) -> List[Tuple[str, str, str, str]]:
+        """
+        已转移但图片和NFO尚未生成的文件，如停止插件时仍在刮削队列中的文件
+        :return: [(源文件, 监控目录, 处理结果, 目标文件)]
+        """
+        with self._lock:
+            rows = self._conn.execute("SELECT path, source_dir, outcome, target FROM pending_artwork "
+                                      "ORDER BY updated").fetchall()
+        return [tuple(row) for row in rows]
+
+    def clear_artwork_pending(self, file_path: str):
+        """
+        图片和NFO已生成，移除待生成记录
+        """
+        try:
+            with self._lock:
+                self._conn.execute("DELETE FROM pending_artwork WHERE path=?", (file_path,))
+                self._conn.commit()
+        except sqlite3.Error as e:
+            logger.error(f"移除待刮削记录失败：{str(e)}")
+
+    def close(self):
+        """
+        关闭数据库连接
+        """
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,95 @@
+import os
+import re
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from app.core.meta.words import WordsMatcher
+from app.log import logger
+
+# 文件名中的季集，如 S01E02
+_SEASON_EPISODE = re.compile(r"S\d+E\d+")
+
+
+class TargetResolver:
+    """
+    未从TMDB刮削时的目标路径计算
+    按（监控目录, 源文件所在目录）缓存剧集标题和目标目录，同一剧集只计算一次；每次加载配置时重新创建
+    """
+
+    def __init__(self, dirconf: Dict[str, str], renameconf: Dict[str, str], maxsize: int = 4096):
+        """
+        :param dirconf: 监控目录 -> 目的目录，加载配置期间逐行添加，此处只保存引用
+        :param renameconf: 监控目录 -> 重命名方式 true/false/smart
+        :param maxsize: 缓存的目录数上限
+        """
+        self._dirconf = dirconf
+        self._renameconf = renameconf
+        self._maxsize = maxsize
+        self._cache: "OrderedDict[Tuple[str, str], Optional[Tuple[str, Path]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._words_matcher: Optional[WordsMatcher] = None
+
+    def resolve_dir(self, source_dir: str, dir_path: str) -> Optional[Tuple[str, Path]]:
+        """
+        计算源目录对应的剧集标题和目标目录
+        :param source_dir: 监控目录
+        :param dir_path: 源文件所在目录
+        :return: (标题, 目标目录)，重命名方式无效时返回None
+        """
+        key = (source_dir, dir_path)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+        result = self.__resolve_dir(source_dir=source_dir, dir_path=dir_path)
+        with self._lock:
+            self._cache[key] = result
+            while len(self._cache) > self._maxsize:
+                self._cache.popitem(last=False)
+        return result
+
+    def resolve(self, source_dir: str, event_path: str) -> Optional[Tuple[str, Path]]:
+        """
+        计算源文件的剧集标题和目标文件，文件名中有季集时重命名为 SxxExx
+        :param source_dir: 监控目录
+        :param event_path: 源文件
+        :return: (标题, 目标文件)，重命名方式无效时返回None
+        """
+        file_path = Path(event_path)
+        resolved = self.resolve_dir(source_dir=source_dir, dir_path=str(file_path.parent))
+        if not resolved:
+            return None
+        title, target_dir = resolved
+        match = _SEASON_EPISODE.search(file_path.name)
+        if match:
+            return title, target_dir / f"{match.group()}{file_path.suffix}"
+        logger.debug(f"{file_path.name} 未找到匹配的季数和集数")
+        return title, target_dir / file_path.name
+
+    def __resolve_dir(self, source_dir: str, dir_path: str) -> Optional[Tuple[str, Path]]:
+        """
+        按重命名方式计算标题和目标目录
+        true：相对目录经自定义识别词处理；false：保持相对目录；smart：取目录名第一个.之前的部分
+        """
+        dest_dir = Path(self._dirconf.get(source_dir))
+        rename_conf = str(self._renameconf.get(source_dir))
+        rel_path = os.path.relpath(dir_path, source_dir)
+        if rel_path == os.curdir:
+            # 文件直接位于监控目录下
+            return dest_dir.name, dest_dir
+        if rename_conf == "true":
+            if not self._words_matcher:
+                self._words_matcher = WordsMatcher()
+            # 自定义识别词
+            title, _ = self._words_matcher.prepare(rel_path)
+            return title, dest_dir / title
+        if rename_conf == "false":
+            return rel_path, dest_dir / rel_path
+        if rename_conf == "smart":
+            # 取.第一个
+            title = Path(rel_path).name.split(".")[0]
+            return title, dest_dir / title
+        logger.error(f"{dir_path} 重命名方式 {rename_conf} 无效")
+        return None
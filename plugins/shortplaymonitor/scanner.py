@@ -0,0 +1,100 @@
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+
+from app.log import logger
+
+# 扫描结束标记
+_DONE = object()
+
+
+def walk_files(root: str, extensions: Iterable[str],
+               exclude: Optional[Callable[[str], Optional[str]]] = None,
+               stop_event: Optional[threading.Event] = None) -> Iterator[os.DirEntry]:
+    """
+    基于 os.scandir 逐个返回目录下的文件，边遍历边返回，不预先生成完整列表
+    :param root: 扫描根目录
+    :param extensions: 文件后缀
+    :param exclude: 排除判断函数，参数为路径，返回排除原因，目录命中时整个子目录不再遍历
+    :param stop_event: 停止标记
+    """
+    extensions = {ext.lower() for ext in extensions}
+    stack = [root]
+    while stack:
+        if stop_event and stop_event.is_set():
+            return
+        current = stack.pop()
+        try:
+            with os.scandir(current) as it:
+                entries = list(it)
+        except OSError as e:
+            logger.warn(f"扫描目录 {current} 失败：{str(e)}")
+            continue
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if exclude and exclude(entry.path + os.sep):
+                        logger.debug(f"{entry.path} 已排除，跳过整个目录")
+                        continue
+                    stack.append(entry.path)
+                elif os.path.splitext(entry.name)[1].lower() in extensions:
+                    if exclude and exclude(entry.path):
+                        continue
+                    yield entry
+            except OSError as e:
+                logger.debug(f"读取 {entry.path} 失败：{str(e)}")
+
+
+def scan_roots(roots: List[str], extensions: Iterable[str],
+               exclude: Optional[Callable[[str], Optional[str]]] = None,
+               workers: int = 4, queue_size: int = 1000) -> Iterator[Tuple[str, os.DirEntry]]:
+    """
+    并发扫描多个根目录，发现文件即返回
+    :param roots: 根目录列表
+    :param extensions: 文件后缀
+    :param exclude: 排除判断函数
+    :param workers: 同时扫描的根目录数
+    :param queue_size: 待消费文件的队列上限，消费慢时扫描线程阻塞
+    :return: (根目录, 文件)
+    """
+    if not roots:
+        return
+    extensions = list(extensions)
+    results = queue.Queue(maxsize=queue_size)
+    stop_event = threading.Event()
+
+    def _put(item):
+        while not stop_event.is_set():
+            try:
+                results.put(item, timeout=1)
+                return
+            except queue.Full:
+                continue
+
+    def _scan(root: str):
+        try:
+            for entry in walk_files(root=root, extensions=extensions, exclude=exclude, stop_event=stop_event):
+                _put((root, entry))
+        except Exception as e:
+            logger.error(f"扫描目录 {root} 出错：{str(e)}")
+        finally:
+            _put(_DONE)
+
+    executor = ThreadPoolExecutor(max_workers=max(min(int(workers), len(roots)), 1),
+                                  thread_name_prefix="ShortPlayMonitor-Scanner")
+    try:
+        for root in roots:
+            executor.submit(_scan, root)
+        remaining = len(roots)
+        while remaining:
+            item = results.get()
+            if item is _DONE:
+                remaining -= 1
+                continue
+            yield item
+    finally:
+        # 消费方提前结束时通知扫描线程退出
+        stop_event.set()
+        executor.shutdown(wait=False)
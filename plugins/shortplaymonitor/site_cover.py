@@ -0,0 +1,346 @@
+import re
+import threading
+import time
+from contextlib import nullcontext
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, List, Optional
+
+import chardet
+from lxml import etree
+from requests import Session
+from requests.adapters import HTTPAdapter
+
+from app.db.site_oper import SiteOper
+from app.helper.sites import SitesHelper
+from app.log import logger
+from app.modules.indexer import TorrentSpider
+from app.utils.http import RequestUtils
+
+from .cache import MediaCache
+from .metrics import Metrics
+
+# 封面检索站点
+COVER_SITES = [
+    {
+        "domain": "agsvpt.com",
+        "search_url": "https://www.agsvpt.com/torrents.php?search_mode=0&search_area=0&page=0&notnewword=1&cat=419&search={title}",
+        "image_xpath": "//*[@id='kdescr']/img[1]/@src",
+        "concurrency": 2,
+        "interval": 1
+    },
+    {
+        "domain": "ilolicon.com",
+        "search_url": "https://share.ilolicon.com/torrents.php?search_mode=0&search_area=0&page=0&notnewword=1&cat=402&search={title}",
+        "image_xpath": "//*[@id='kdescr']/img[1]/@src",
+        "concurrency": 2,
+        "interval": 1
+    }
+]
+
+# Content-Type 中的编码
+_HEADER_CHARSET = re.compile(r"charset=[\"']?([\w.:-]+)", re.IGNORECASE)
+# 页面 meta 中的编码
+_META_CHARSET = re.compile(rb"<meta[^>]+charset\s*=\s*[\"']?([\w.:-]+)", re.IGNORECASE)
+# 查找 meta 编码的页面头部长度
+_META_SCAN_SIZE = 4096
+# 编码探测的采样长度
+_DETECT_SAMPLE_SIZE = 32 * 1024
+# 使用兼容的超集编码解码
+_ENCODING_ALIASES = {
+    "gb2312": "gb18030",
+    "gbk": "gb18030",
+    "iso-8859-1": "cp1252",
+}
+
+
+def parse_cover_sites(cover_sites: Optional[str]) -> List[dict]:
+    """
+    解析封面检索站点配置，每行一个站点，为空时使用默认站点
+    格式：站点域名#检索地址（标题用{title}代替）#封面XPath#并发数#请求间隔（秒），并发数和请求间隔可省略
+    """
+    if not cover_sites or not cover_sites.strip():
+        return COVER_SITES
+    confs = []
+    for line in cover_sites.split("\n"):
+        line = line.strip()
+        if not line:
+            continue
+        parts = line.split("#")
+        if len(parts) < 3 or "{title}" not in parts[1]:
+            logger.error(f"封面检索站点配置 {line} 格式错误")
+            continue
+        try:
+            confs.append({
+                "domain": parts[0].strip(),
+                "search_url": parts[1].strip(),
+                "image_xpath": parts[2].strip(),
+                "concurrency": int(parts[3]) if len(parts) > 3 and parts[3].strip() else 2,
+                "interval": float(parts[4]) if len(parts) > 4 and parts[4].strip() else 1
+            })
+        except ValueError:
+            logger.error(f"封面检索站点配置 {line} 并发数或请求间隔错误")
+    return confs
+
+
+class _SiteLimiter:
+    """
+    站点请求限制：同时请求数及两次请求的最小间隔
+    """
+
+    def __init__(self, concurrency: int, interval: float):
+        self._semaphore = threading.BoundedSemaphore(max(int(concurrency), 1))
+        self._interval = max(float(interval), 0)
+        self._lock = threading.Lock()
+        self._next_time = 0.0
+
+    def __enter__(self):
+        self._semaphore.acquire()
+        with self._lock:
+            now = time.monotonic()
+            wait_time = self._next_time - now
+            self._next_time = max(now, self._next_time) + self._interval
+        if wait_time > 0:
+            time.sleep(wait_time)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._semaphore.release()
+
+
+class SiteCoverFinder:
+    """
+    从PT站检索短剧封面
+    站点和索引器在加载配置时解析一次，每个站点复用一个连接池会话，检索结果（包括未找到）按标题缓存；
+    多个站点同时检索，最先返回封面的站点胜出
+    """
+
+    def __init__(self, cache: MediaCache, site_confs: Optional[List[dict]] = None,
+                 metrics: Optional[Metrics] = None):
+        """
+        :param cache: 封面地址缓存
+        :param site_confs: 检索站点配置，默认使用 COVER_SITES
+        :param metrics: 运行统计，缓存命中计数，未命中时统计站点检索耗时
+        """
+        self._cache = cache
+        self._metrics = metrics
+        self._site_confs = site_confs or COVER_SITES
+        self._sites: List[dict] = []
+        self._executor = ThreadPoolExecutor(max_workers=max(len(self._site_confs) * 2, 2),
+                                            thread_name_prefix="ShortPlayMonitor-Cover")
+        self._sessions: Dict[str, Session] = {}
+        # 站点页面编码
+        self._encodings: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self.refresh()
+
+    def refresh(self):
+        """
+        重新解析站点和索引器
+        """
+        sites = []
+        for conf in self._site_confs:
+            domain = conf.get("domain")
+            site = SiteOper().get_by_domain(domain)
+            if not site:
+                continue
+            sites.append({
+                **conf,
+                "site": site,
+                "indexer": SitesHelper().get_indexer(domain),
+                "limiter": _SiteLimiter(concurrency=conf.get("concurrency") or 2,
+                                        interval=conf.get("interval") or 0)
+            })
+        with self._lock:
+            self._sites = sites
+        logger.info(f"封面检索站点：{'、'.join([site.get('site').name for site in sites]) or '无'}")
+
+    def save_cache(self):
+        """
+        持久化封面地址缓存
+        """
+        self._cache.save()
+
+    def close(self):
+        """
+        关闭站点会话
+        """
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions = {}
+
+    def find(self, title: str) -> Optional[str]:
+        """
+        检索标题对应的封面地址
+        :return: 封面地址，未找到时返回None
+        """
+        hit, image = self._cache.get(title)
+        if hit:
+            if self._metrics:
+                self._metrics.incr("site_cover_cache_hit")
+            logger.debug(f"{title} 封面检索命中缓存：{image}")
+            return image
+
+        image = None
+        errors = 0
+        # 只统计实际访问站点的耗时
+        with self._metrics.timer("site_fetch") if self._metrics else nullcontext() as timer:
+            # 所有站点同时检索，任一站点检索到封面后通知其它站点停止
+            cancel_event = threading.Event()
+            pending = {self._executor.submit(self.__search_site, title, site_conf, cancel_event)
+                       for site_conf in self._sites}
+            while pending and not image:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    try:
+                        image = image or future.result()
+                    except Exception as e:
+                        errors += 1
+                        logger.error(f"检索 {title} 封面出错：{str(e)}")
+            if pending:
+                cancel_event.set()
+                for future in pending:
+                    future.cancel()
+            if errors and not image and timer:
+                timer.fail()
+
+        # 站点请求出错时不缓存未找到的结果，下次重试
+        if image or not errors:
+            self._cache.set(title, image)
+        return image
+
+    def __session(self, domain: str) -> Session:
+        """
+        获取站点会话，同一站点复用连接
+        """
+        with self._lock:
+            session = self._sessions.get(domain)
+            if not session:
+                session = Session()
+                adapter = HTTPAdapter(pool_connections=2, pool_maxsize=4)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                self._sessions[domain] = session
+            return session
+
+    def __search_site(self, title: str, site_conf: dict, cancel_event: threading.Event) -> Optional[str]:
+        """
+        检索单个站点
+        """
+        if cancel_event.is_set():
+            return None
+        logger.info(f"开始检索 {site_conf.get('site').name} {title}")
+        return self.__get_site_torrents(url=site_conf.get("search_url").format(title=title),
+                                        site_conf=site_conf,
+                                        cancel_event=cancel_event)
+
+    def __get_site_torrents(self, url: str, site_conf: dict, cancel_event: threading.Event) -> Optional[str]:
+        """
+        查询站点资源
+        """
+        site = site_conf.get("site")
+        page_source = self.__get_page_source(url=url, site_conf=site_conf)
+        if not page_source:
+            raise Exception(f"请求站点 {site.name} 失败")
+        _spider = TorrentSpider(indexer=site_conf.get("indexer"),
+                                page=1)
+        torrents = _spider.parse(page_source)
+        if not torrents:
+            logger.error(f"未检索到站点 {site.name} 资源")
+            return None
+
+        # 其它站点已检索到封面
+        if cancel_event.is_set():
+            return None
+
+        # 获取种子详情页
+        page_url = torrents[0].get("page_url")
+        torrent_detail_source = self.__get_page_source(url=page_url, site_conf=site_conf)
+        if not torrent_detail_source:
+            raise Exception(f"请求种子详情页失败 {page_url}")
+
+        html = etree.HTML(torrent_detail_source)
+        if html is None:
+            raise Exception(f"解析种子详情页失败 {page_url}")
+
+        images = html.xpath(site_conf.get("image_xpath"))
+        if not images or not images[0]:
+            logger.error(f"未获取到种子封面图 {page_url}")
+            return None
+
+        return str(images[0])
+
+    def __get_page_source(self, url: str, site_conf: dict) -> str:
+        """
+        获取页面资源
+        """
+        site = site_conf.get("site")
+        with site_conf.get("limiter"):
+            ret = RequestUtils(
+                cookies=site.cookie,
+                timeout=30,
+                session=self.__session(site_conf.get("domain")),
+            ).get_res(url, allow_redirects=True)
+        if ret is None or not ret.content:
+            return ""
+        return self.__decode(raw_data=ret.content,
+                             content_type=ret.headers.get("Content-Type"),
+                             domain=site_conf.get("domain"))
+
+    def __decode(self, raw_data: bytes, content_type: Optional[str], domain: str) -> str:
+        """
+        解码页面，编码依次取自：Content-Type、站点缓存、页面头部 meta、采样探测
+        站点缓存只代替 meta 查找和采样探测，响应头声明的编码始终优先，探测成功后按站点缓存
+        """
+        encoding = self.__header_encoding(content_type)
+        if encoding:
+            try:
+                return raw_data.decode(encoding)
+            except (UnicodeDecodeError, LookupError):
+                pass
+
+        encoding = self._encodings.get(domain)
+        if encoding:
+            try:
+                return raw_data.decode(encoding)
+            except (UnicodeDecodeError, LookupError):
+                self._encodings.pop(domain, None)
+
+        for encoding in self.__sniff_encodings(raw_data):
+            try:
+                page_source = raw_data.decode(encoding)
+            except (UnicodeDecodeError, LookupError):
+                continue
+            self._encodings[domain] = encoding
+            logger.debug(f"站点 {domain} 页面编码：{encoding}")
+            return page_source
+
+        return raw_data.decode("utf-8", errors="replace")
+
+    @staticmethod
+    def __header_encoding(content_type: Optional[str]) -> Optional[str]:
+        """
+        Content-Type 声明的编码
+        """
+        if not content_type:
+            return None
+        match = _HEADER_CHARSET.search(content_type)
+        if not match:
+            return None
+        return _ENCODING_ALIASES.get(match.group(1).lower(), match.group(1))
+
+    @staticmethod
+    def __sniff_encodings(raw_data: bytes):
+        """
+        按优先级返回从页面内容探测的候选编码
+        """
+        match = _META_CHARSET.search(raw_data[:_META_SCAN_SIZE])
+        if match:
+            charset = match.group(1).decode("ascii", errors="ignore").lower()
+            yield _ENCODING_ALIASES.get(charset, charset)
+        # 只对部分内容探测，避免大页面全量探测
+        detected = chardet.detect(raw_data[:_DETECT_SAMPLE_SIZE]).get("encoding")
+        if detected:
+            yield _ENCODING_ALIASES.get(detected.lower(), detected)
+        yield "utf-8"
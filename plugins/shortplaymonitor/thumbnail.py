@@ -0,0 +1,186 @@
+import math
+import os
+import re
+import signal
+import subprocess
+import threading
+from typing import List, Optional, Sequence
+
+from PIL import Image
+
+from app.log import logger
+
+try:
+    import numpy as np
+except ImportError:
+    # 没有numpy时使用Pillow统计评分
+    np = None
+
+# PPM帧头：P6 宽 高 最大值，字段间为空白，可能有注释
+_PPM_HEADER = re.compile(rb"P6\s+(?:#[^\n]*\n\s*)*(\d+)\s+(?:#[^\n]*\n\s*)*(\d+)\s+(?:#[^\n]*\n\s*)*(\d+)\s")
+
+# 评分时缩小到的宽度
+_SCORE_WIDTH = 320
+
+# 平均亮度低于或高于该值的帧视为黑屏或白屏
+_DARK_LEVEL = 16
+_BRIGHT_LEVEL = 240
+
+
+def extract_frames(video_path: str, timelines: Sequence[str], timeout: float = 60) -> List[Image.Image]:
+    """
+    一次ffmpeg调用截取多个时间点的帧
+    每个时间点作为一个 -ss 定位的输入，-ss 放在 -i 之前按关键帧快速定位，不从头解码；各取一帧后拼接，
+    以PPM格式从管道输出，不写临时文件；参数以列表方式传入，不经过shell
+    :param video_path: 视频文件路径
+    :param timelines: 截取时间点
+    :param timeout: 超时时间（秒）
+    :return: 截取到的帧，超出视频时长的时间点没有帧
+    """
+    cmd = ["ffmpeg", "-hide_banner", "-loglevel", "error"]
+    for timeline in timelines:
+        cmd += ["-ss", timeline, "-i", video_path]
+    graph = "".join(f"[{index}:v:0]trim=end_frame=1,setpts=PTS-STARTPTS[v{index}];"
+                    for index in range(len(timelines)))
+    graph += "".join(f"[v{index}]" for index in range(len(timelines)))
+    graph += f"concat=n={len(timelines)}:v=1:a=0[out]"
+    cmd += ["-filter_complex", graph, "-map", "[out]", "-vsync", "0",
+            "-f", "image2pipe", "-c:v", "ppm", "pipe:1"]
+    data = _run_ffmpeg(cmd, video_path=video_path, timeout=timeout)
+    if not data:
+        return []
+    return read_ppm_frames(data)
+
+
+def read_ppm_frames(data: bytes) -> List[Image.Image]:
+    """
+    解析连续的PPM帧
+    """
+    frames = []
+    offset = 0
+    while offset < len(data):
+        match = _PPM_HEADER.match(data, offset)
+        if not match:
+            break
+        width, height, maxval = (int(value) for value in match.groups())
+        size = width * height * (3 if maxval < 256 else 6)
+        start = match.end()
+        if maxval >= 256 or start + size > len(data):
+            break
+        frames.append(Image.frombytes("RGB", (width, height), data[start:start + size]))
+        offset = start + size
+    return frames
+
+
+def score_frame(image: Image.Image) -> float:
+    """
+    帧评分，亮度方差与直方图熵越大画面内容越丰富，黑屏、白屏及纯色字幕卡得分低
+    """
+    if image.width > _SCORE_WIDTH:
+        image = image.resize((_SCORE_WIDTH, max(int(image.height * _SCORE_WIDTH / image.width), 1)),
+                             Image.BILINEAR)
+    luma = image.convert("L")
+    if np is not None:
+        pixels = np.asarray(luma, dtype=np.float32)
+        mean = float(pixels.mean())
+        std = float(pixels.std())
+        hist = np.bincount(pixels.astype(np.uint8).ravel(), minlength=256).astype(np.float64)
+        hist = hist[hist > 0] / pixels.size
+        entropy = float(-(hist * np.log2(hist)).sum())
+    else:
+        histogram = luma.histogram()
+        total = sum(histogram) or 1
+        mean = sum(level * count for level, count in enumerate(histogram)) / total
+        std = math.sqrt(sum(count * (level - mean) ** 2 for level, count in enumerate(histogram)) / total)
+        entropy = -sum(count / total * math.log2(count / total) for count in histogram if count)
+    if mean < _DARK_LEVEL or mean > _BRIGHT_LEVEL:
+        return 0
+    # 方差和熵各归一化到0~1
+    return min(std / 64, 1) * 0.5 + entropy / 8 * 0.5
+
+
+def select_frame(frames: Sequence[Image.Image]) -> Optional[Image.Image]:
+    """
+    选出评分最高的帧，分数相同时取时间点靠前的
+    """
+    best, best_score = None, -1.0
+    for frame in frames:
+        score = score_frame(frame)
+        if score > best_score:
+            best, best_score = frame, score
+    return best
+
+
+def _run_ffmpeg(cmd: List[str], video_path: str, timeout: float) -> Optional[bytes]:
+    """
+    运行ffmpeg，超时结束进程
+    :return: 标准输出，失败返回None
+    """
+    try:
+        process = subprocess.Popen(cmd,
+                                   stdin=subprocess.DEVNULL,
+                                   stdout=subprocess.PIPE,
+                                   stderr=subprocess.PIPE,
+                                   start_new_session=True)
+    except OSError as e:
+        logger.error(f"启动ffmpeg失败：{str(e)}")
+        return None
+    try:
+        stdout, stderr = process.communicate(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        _kill_process(process)
+        process.communicate()
+        logger.error(f"ffmpeg截取 {video_path} 超时（{timeout}秒），已结束进程")
+        return None
+    if process.returncode != 0:
+        logger.error(f"ffmpeg截取 {video_path} 失败：{stderr.decode('utf-8', errors='ignore').strip()}")
+        return None
+    return stdout
+
+
+def _kill_process(process: subprocess.Popen):
+    """
+    结束ffmpeg进程及其子进程
+    """
+    try:
+        if hasattr(os, "killpg"):
+            os.killpg(process.pid, signal.SIGKILL)
+        else:
+            process.kill()
+    except (OSError, ProcessLookupError):
+        pass
+
+
+def parse_timelines(text: str, default: str = "00:00:10") -> List[str]:
+    """
+    解析截图时间点配置，多个时间点以英文逗号分隔
+    """
+    timelines = [timeline.strip() for timeline in str(text or "").split(",") if timeline.strip()]
+    return timelines or [default]
+
+
+class ThumbnailEngine:
+    """
+    缩略图截取，限制同时运行的ffmpeg进程数
+    """
+
+    def __init__(self, concurrency: int = 2, timeout: float = 60):
+        """
+        :param concurrency: 最大并发ffmpeg进程数
+        :param timeout: 单个任务超时时间（秒）
+        """
+        self._semaphore = threading.BoundedSemaphore(max(int(concurrency), 1))
+        self._timeout = timeout
+
+    def grab(self, video_path: str, timelines: Sequence[str] = ("00:00:10",)) -> Optional[Image.Image]:
+        """
+        截取缩略图到内存，超过并发数时等待
+        多个时间点时一次截取全部候选帧，选画面内容最丰富的一帧；
+        拼接截取失败时（如某个时间点超出短视频时长或某个输入解码出错）只截取第一个时间点
+        """
+        with self._semaphore:
+            frames = extract_frames(video_path=video_path, timelines=timelines, timeout=self._timeout)
+            if not frames and len(timelines) > 1:
+                logger.debug(f"{video_path} 多时间点截取失败，改为截取 {timelines[0]}")
+                frames = extract_frames(video_path=video_path, timelines=timelines[:1], timeout=self._timeout)
+            return select_frame(frames)
@@ -0,0 +1,306 @@
+import os
+import threading
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from watchdog.events import EVENT_TYPE_CREATED, EVENT_TYPE_MOVED
+from watchdog.observers import Observer
+from watchdog.observers.api import BaseObserver
+
+from app.log import logger
+
+from .polling import IncrementalPollingObserver, SnapshotStore
+
+try:
+    from watchdog.observers.inotify import InotifyEmitter
+    from watchdog.observers.inotify_buffer import InotifyBuffer
+    from watchdog.observers.inotify_c import Inotify
+except ImportError:
+    # 非Linux系统没有inotify，按深度监控不可用
+    InotifyEmitter = None
+
+# 系统inotify监控数量上限
+_MAX_USER_WATCHES = "/proc/sys/fs/inotify/max_user_watches"
+
+# inotify数量不足时的处理提示
+INOTIFY_HINT = """
+     echo fs.inotify.max_user_watches=524288 | sudo tee -a /etc/sysctl.conf
+     echo fs.inotify.max_user_instances=524288 | sudo tee -a /etc/sysctl.conf
+     sudo sysctl -p
+     """
+
+
+def max_user_watches() -> Optional[int]:
+    """
+    读取系统inotify监控数量上限，读取失败返回None
+    """
+    try:
+        with open(_MAX_USER_WATCHES) as f:
+            return int(f.read().strip())
+    except (OSError, ValueError):
+        return None
+
+
+def _supports_depth_limit() -> bool:
+    """
+    按深度监控依赖 watchdog 内部结构（InotifyEmitter._inotify 为 InotifyBuffer，其 _inotify 为 Inotify），
+    版本变化导致结构不同时返回False，改用默认递归监控
+    """
+    if not InotifyEmitter:
+        return False
+    try:
+        return hasattr(Inotify, "add_watch") \
+            and "_inotify" in InotifyEmitter.on_thread_start.__code__.co_names \
+            and "_inotify" in InotifyBuffer.__init__.__code__.co_names
+    except AttributeError:
+        return False
+
+
+def path_depth(root: str, path: str) -> int:
+    """
+    路径相对根目录的深度，根目录为0
+    """
+    rel_path = os.path.relpath(path, root)
+    if rel_path == os.curdir:
+        return 0
+    return len(rel_path.split(os.sep))
+
+
+def iter_dirs(root: str, max_depth: Optional[int] = None) -> Iterator[Tuple[str, int]]:
+    """
+    遍历目录下的所有子目录（含根目录），不跟随符号链接
+    :param root: 根目录
+    :param max_depth: 最大深度，None为不限
+    :return: (目录, 深度)
+    """
+    stack = [(root, 0)]
+    while stack:
+        current, depth = stack.pop()
+        yield current, depth
+        if max_depth is not None and depth >= max_depth:
+            continue
+        try:
+            with os.scandir(current) as it:
+                for entry in it:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append((entry.path, depth + 1))
+                    except OSError:
+                        continue
+        except OSError as e:
+            logger.debug(f"读取目录 {current} 失败：{str(e)}")
+
+
+def count_dirs(root: str, max_depth: Optional[int] = None) -> int:
+    """
+    统计目录数，即监控该目录需要的inotify数量
+    """
+    return sum(1 for _ in iter_dirs(root, max_depth))
+
+
+if InotifyEmitter:
+    class _DepthLimitedEmitter(InotifyEmitter):
+        """
+        按深度监控的inotify发送器
+        只为根目录下指定深度内的目录添加inotify，新建目录在深度内时补充监控，
+        超出深度的新目录通过 on_new_dir 回调交给调用方定向补扫
+        """
+        max_depth = 1
+        on_new_dir: Optional[Callable[[str, str, bool], Any]] = None
+
+        def on_thread_start(self):
+            # 监控为非递归，父类只为根目录添加inotify
+            super().on_thread_start()
+            self.__add_watches(self.watch.path, 0)
+
+        def __add_watches(self, path: str, depth: int):
+            """
+            为目录及其深度内的子目录添加inotify
+            """
+            inotify = getattr(self._inotify, "_inotify", None)
+            if not inotify or not hasattr(inotify, "add_watch"):
+                logger.warn(f"watchdog 内部结构已变化，无法为 {path} 的子目录添加监控，请关闭监控深度设置")
+                return
+            for dir_path, _ in iter_dirs(path, self.max_depth - depth):
+                if dir_path == self.watch.path:
+                    continue
+                try:
+                    inotify.add_watch(os.fsencode(dir_path))
+                except OSError as e:
+                    logger.warn(f"{dir_path} 添加目录监控失败：{str(e)}")
+                    return
+
+        def queue_event(self, event):
+            if event.is_directory and event.event_type in (EVENT_TYPE_CREATED, EVENT_TYPE_MOVED):
+                dir_path = event.dest_path if event.event_type == EVENT_TYPE_MOVED else event.src_path
+                if dir_path:
+                    depth = path_depth(self.watch.path, dir_path)
+                    if depth <= self.max_depth:
+                        self.__add_watches(dir_path, depth)
+                    if self.on_new_dir:
+                        try:
+                            self.on_new_dir(self.watch.path, dir_path, depth > self.max_depth)
+                        except Exception as e:
+                            logger.error(f"{dir_path} 新目录处理失败：{str(e)}")
+            super().queue_event(event)
+else:
+    _DepthLimitedEmitter = None
+
+
+class SharedObservers:
+    """
+    目录监控服务
+    每种监控方式共用一个观察者，所有监控目录挂在同一个观察者上，并统计inotify数量；
+    设置监控深度时只监控深度内的目录，更深目录的变化由调用方定向补扫
+    """
+
+    def __init__(self, watch_depth: int = 0, on_new_dir: Callable[[str, str, bool], Any] = None,
+                 timeout: int = 10, snapshot_store: Optional[SnapshotStore] = None,
+                 exclude: Optional[Callable[[str], Optional[str]]] = None, poll_max_interval: int = 300):
+        """
+        :param watch_depth: 监控深度，0为递归监控全部子目录
+        :param on_new_dir: 新建目录回调，参数为监控目录、新目录及是否超出监控深度
+        :param timeout: 观察者超时时间（秒），兼容模式下为有变化时的轮询间隔
+        :param snapshot_store: 兼容模式轮询快照持久化
+        :param exclude: 排除判断函数，兼容模式下命中的目录不轮询
+        :param poll_max_interval: 兼容模式空闲时的最长轮询间隔（秒）
+        """
+        self._watch_depth = max(int(watch_depth or 0), 0)
+        if self._watch_depth and _DepthLimitedEmitter and not _supports_depth_limit():
+            logger.warn("当前 watchdog 版本不支持按深度监控，改为递归监控全部子目录")
+            self._watch_depth = 0
+        self._on_new_dir = on_new_dir
+        self._timeout = timeout
+        self._snapshot_store = snapshot_store
+        self._exclude = exclude
+        self._poll_max_interval = poll_max_interval
+        self._observers: Dict[str, BaseObserver] = {}
+        self._watches: Dict[str, int] = {}
+        self._budgeted_paths: List[str] = []
+        self._limit = max_user_watches()
+        self._lock = threading.Lock()
+
+    @property
+    def budgeted(self) -> bool:
+        """
+        是否按深度监控
+        """
+        return bool(self._watch_depth and _DepthLimitedEmitter)
+
+    @property
+    def watches(self) -> int:
+        """
+        已使用的inotify数量
+        """
+        with self._lock:
+            return sum(self._watches.values())
+
+    @property
+    def limit(self) -> Optional[int]:
+        """
+        系统inotify数量上限
+        """
+        return self._limit
+
+    def __observer(self, mode: str) -> BaseObserver:
+        """
+        获取监控方式对应的观察者，不存在时创建并启动
+        """
+        observer = self._observers.get(mode)
+        if observer:
+            return observer
+        if mode == "compatibility":
+            # 兼容模式，可以兼容挂载的远程共享目录如SMB；增量轮询，空闲时拉长间隔以便NAS休眠
+            observer = IncrementalPollingObserver(store=self._snapshot_store,
+                                                  exclude=self._exclude,
+                                                  min_interval=self._timeout,
+                                                  max_interval=self._poll_max_interval)
+        elif self.budgeted:
+            emitter_class = type("DepthLimitedInotifyEmitter", (_DepthLimitedEmitter,),
+                                 {"max_depth": self._watch_depth,
+                                  "on_new_dir": staticmethod(self._on_new_dir) if self._on_new_dir else None})
+            observer = BaseObserver(emitter_class=emitter_class, timeout=self._timeout)
+        else:
+            # 内部处理系统操作类型选择最优解
+            observer = Observer(timeout=self._timeout)
+        observer.daemon = True
+        # 先启动观察者，之后添加的目录立即开始监控，启动失败时异常只影响对应目录
+        observer.start()
+        self._observers[mode] = observer
+        return observer
+
+    def schedule(self, mode: str, path: str, handler) -> int:
+        """
+        添加监控目录
+        :param mode: 监控方式 fast/compatibility
+        :param path: 监控目录
+        :param handler: 事件处理
+        :return: 该目录使用的inotify数量，递归监控时在后台统计，返回None
+        """
+        watches = 0
+        if mode != "compatibility" and self.budgeted:
+            watches = count_dirs(path, self._watch_depth)
+            self.__check_limit(path, watches)
+        observer = self.__observer(mode)
+        observer.schedule(handler, path=path, recursive=not (mode != "compatibility" and self.budgeted))
+        with self._lock:
+            self._watches[path] = watches
+            if mode != "compatibility" and self.budgeted:
+                self._budgeted_paths.append(path)
+        if mode != "compatibility" and not self.budgeted:
+            # 递归监控时数量只用于提示，在后台遍历，不阻塞启动
+            threading.Thread(target=self.__count_watches, args=(path,),
+                             name="ShortPlayMonitor-CountWatches", daemon=True).start()
+            return None
+        return watches
+
+    def __count_watches(self, path: str):
+        """
+        后台统计递归监控目录使用的inotify数量
+        """
+        try:
+            watches = count_dirs(path)
+        except Exception as e:
+            logger.debug(f"统计 {path} 目录数失败：{str(e)}")
+            return
+        with self._lock:
+            if path not in self._watches:
+                # 已停止监控
+                return
+            self._watches[path] = watches
+        logger.info(f"{path} 的目录监控使用inotify {watches} 个，累计 {self.watches} 个，"
+                    f"系统上限 {self._limit or '未知'}")
+        self.__check_limit(path, watches)
+
+    def __check_limit(self, path: str, watches: int):
+        """
+        数量超过系统上限时提示
+        """
+        with self._lock:
+            total = sum(count for other, count in self._watches.items() if other != path) + watches
+        if self._limit and total > self._limit:
+            logger.warn(f"{path} 需要 {watches} 个inotify，累计 {total} 个，超过系统上限 {self._limit}，"
+                        f"请设置监控深度或在宿主机上（不是docker容器内）执行以下命令并重启：{INOTIFY_HINT}")
+
+    def budgeted_paths(self) -> List[str]:
+        """
+        按深度监控的目录
+        """
+        with self._lock:
+            return list(self._budgeted_paths)
+
+    def stop(self):
+        """
+        停止所有观察者
+        """
+        for observer in self._observers.values():
+            try:
+                observer.stop()
+                observer.join()
+            except Exception as e:
+                logger.error(f"停止目录监控失败：{str(e)}")
+        self._observers = {}
+        if self._snapshot_store:
+            self._snapshot_store.save()
+        with self._lock:
+            self._watches = {}
+            self._budgeted_paths = []
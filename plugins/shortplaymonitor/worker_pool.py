@@ -0,0 +1,123 @@
+import queue
+import threading
+import zlib
+from typing import Any, Callable, List, Tuple
+
+from app.log import logger
+
+# 停止标记
+_STOP = object()
+
+
+class ShardedWorkerPool:
+    """
+    按键分片的线程池
+    相同键的任务进入同一个工作线程按顺序执行，不同键的任务并发执行；
+    每个工作线程的队列有长度上限，队列满时提交阻塞，避免积压任务占满内存
+    """
+
+    def __init__(self, workers: int = 4, queue_size: int = 100, name: str = "ShortPlayMonitor-Worker"):
+        """
+        :param workers: 工作线程数
+        :param queue_size: 每个工作线程的队列长度上限
+        :param name: 线程名称前缀
+        """
+        self._workers = max(int(workers), 1)
+        self._queues: List[queue.Queue] = [queue.Queue(maxsize=queue_size) for _ in range(self._workers)]
+        self._stop_event = threading.Event()
+        # 停止时未执行的任务
+        self._dropped: List[Tuple[Callable, tuple, dict]] = []
+        self._dropped_lock = threading.Lock()
+        self._threads: List[threading.Thread] = []
+        for index, q in enumerate(self._queues):
+            thread = threading.Thread(target=self.__run, args=(q,), name=f"{name}-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    @property
+    def depth(self) -> int:
+        """
+        排队中的任务数
+        """
+        return sum(q.qsize() for q in self._queues)
+
+    def submit(self, key: Any, func: Callable, *args, **kwargs) -> bool:
+        """
+        提交任务，队列满时阻塞直到有空位
+        :param key: 分片键，相同键的任务按提交顺序执行
+        :param func: 任务函数
+        :return: 是否提交成功，线程池已停止时返回False
+        """
+        q = self._queues[zlib.crc32(str(key).encode("utf-8")) % self._workers]
+        while not self._stop_event.is_set():
+            try:
+                q.put((func, args, kwargs), timeout=1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def join(self):
+        """
+        等待已提交的任务全部执行完成
+        """
+        for q in self._queues:
+            q.join()
+
+    def cancel(self):
+        """
+        标记停止，之后不再执行排队中的任务，阻塞中的提交在1秒内返回失败
+        """
+        self._stop_event.set()
+
+    def stop(self) -> List[Tuple[Callable, tuple, dict]]:
+        """
+        停止线程池，正在执行的任务执行完后退出，排队中的任务不再执行
+        :return: 未执行的任务 (func, args, kwargs)，由调用方记录以便重启后恢复
+        """
+        self._stop_event.set()
+        for q in self._queues:
+            # 取出排队任务
+            while True:
+                try:
+                    item = q.get_nowait()
+                except queue.Empty:
+                    break
+                self.__drop(item)
+                q.task_done()
+            q.put(_STOP)
+        for thread in self._threads:
+            if thread is not threading.current_thread():
+                thread.join(timeout=10)
+        self._threads = []
+        with self._dropped_lock:
+            dropped, self._dropped = self._dropped, []
+        return dropped
+
+    def __drop(self, item):
+        """
+        记录未执行的任务
+        """
+        if item is _STOP:
+            return
+        with self._dropped_lock:
+            self._dropped.append(item)
+
+    def __run(self, q: queue.Queue):
+        """
+        工作线程
+        """
+        while True:
+            item = q.get()
+            try:
+                if item is _STOP:
+                    return
+                if self._stop_event.is_set():
+                    self.__drop(item)
+                    continue
+                func, args, kwargs = item
+                func(*args, **kwargs)
+            except Exception as e:
+                logger.error(f"执行任务出错：{str(e)}")
+            finally:
+                q.task_done()